@@ -1,12 +1,25 @@
-import argparse
+import sys, argparse
 from lib.augmented_generation import (
+    RAG_PROMPTS,
     rag_command,
     summarize_command,
     citations_command,
     question_command,
+    batch_command,
+    stream_command,
+    print_stream_stats,
+    print_context_stats,
+    read_questions,
 )
 
-from lib.search_utils import DEFAULT_SEARCH_LIMIT
+from lib.search_utils import DEFAULT_SEARCH_LIMIT, RAG_CONTEXT_TOKENS
+
+heads = {
+    "rag": "RAG Response:",
+    "summarize": "LLM Summary:",
+    "citations": "LLM Answer:",
+    "question": "Answer:",
+}
 
 def main():
     parser = argparse.ArgumentParser(description="Retrieval Augmented Generation CLI")
@@ -14,50 +27,90 @@ def main():
 
     rag_parser = subparsers.add_parser("rag", help="Perform RAG (search + generate answer)")
     rag_parser.add_argument("query", type=str, help="Search query for RAG")
+    rag_parser.add_argument("--stream", action="store_true", help="Print the answer token by token as it is generated")
+    rag_parser.add_argument("--context-tokens", type=int, default=RAG_CONTEXT_TOKENS, help="Token budget for retrieved context in the prompt (default=%(default)s)")
 
     summarize_parser = subparsers.add_parser("summarize", help="Generate multi-document summary")
     summarize_parser.add_argument("query", type=str, help="Search query for summarization")
     summarize_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
+    summarize_parser.add_argument("--stream", action="store_true", help="Print the answer token by token as it is generated")
+    summarize_parser.add_argument("--context-tokens", type=int, default=RAG_CONTEXT_TOKENS, help="Token budget for retrieved context in the prompt (default=%(default)s)")
 
     citations_parser = subparsers.add_parser("citations", help="Generate citations-aware answer")
     citations_parser.add_argument("query", type=str, help="Search query for answer")
     citations_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
+    citations_parser.add_argument("--stream", action="store_true", help="Print the answer token by token as it is generated")
+    citations_parser.add_argument("--context-tokens", type=int, default=RAG_CONTEXT_TOKENS, help="Token budget for retrieved context in the prompt (default=%(default)s)")
 
     question_parser = subparsers.add_parser("question", help="Generate RAG answer")
     question_parser.add_argument("query", type=str, help="Search query for answer")
     question_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
+    question_parser.add_argument("--stream", action="store_true", help="Print the answer token by token as it is generated")
+    question_parser.add_argument("--context-tokens", type=int, default=RAG_CONTEXT_TOKENS, help="Token budget for retrieved context in the prompt (default=%(default)s)")
+
+    batch_parser = subparsers.add_parser("batch", help="Answer a file of questions with one shared retrieval pipeline")
+    batch_parser.add_argument("questions", type=str, help="File with one question per line ('-' reads stdin)")
+    batch_parser.add_argument("--mode", type=str, choices=list(RAG_PROMPTS), default="question", help="Prompt used for every question (default=question)")
+    batch_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
+    batch_parser.add_argument("--output", type=str, help="Write answers as JSON lines to this file instead of printing them")
+    batch_parser.add_argument("--context-tokens", type=int, default=RAG_CONTEXT_TOKENS, help="Token budget for retrieved context in the prompt (default=%(default)s)")
 
     args = parser.parse_args()
 
+    if args.command in heads and args.stream:
+        limit = getattr(args, "limit", DEFAULT_SEARCH_LIMIT)
+        results, tokens, context = stream_command(args.command, args.query, limit, args.context_tokens)
+        print("Search Results:")
+        for r in results:
+            print(f"  - {r}")
+        print(f"\n{heads[args.command]}")
+        for token in tokens:
+            print(token, end="", flush=True)
+        print()
+        print_stream_stats(tokens)
+        print_context_stats(context)
+        return
+
     match args.command:
         case "rag":
-            results, response = rag_command(args.query)
+            results, response, context = rag_command(args.query, context_tokens=args.context_tokens)
             print("Search Results:")
             for r in results:
                 print(f"  - {r}")
             print("\nRAG Response:")
             print(response)
+            print_context_stats(context)
         case "summarize":
-            results, response = summarize_command(args.query, args.limit)
+            results, response, context = summarize_command(args.query, args.limit, args.context_tokens)
             print("Search Results:")
             for r in results:
                 print(f"  - {r}")
             print("\nLLM Summary:")
             print(response)
+            print_context_stats(context)
         case "citations":
-            results, response = citations_command(args.query, args.limit)
+            results, response, context = citations_command(args.query, args.limit, args.context_tokens)
             print("Search Results:")
             for r in results:
                 print(f"  - {r}")
             print("\nLLM Answer:")
             print(response)
+            print_context_stats(context)
         case "question":
-            results, response = question_command(args.query, args.limit)
+            results, response, context = question_command(args.query, args.limit, args.context_tokens)
             print("Search Results:")
             for r in results:
                 print(f"  - {r}")
             print("\nAnswer:")
             print(response)
+            print_context_stats(context)
+        case "batch":
+            if args.questions == "-":
+                questions = read_questions(sys.stdin)
+            else:
+                with open(args.questions, "r") as f:
+                    questions = read_questions(f)
+            batch_command(args.mode, questions, args.limit, args.output, args.context_tokens)
         case _:
             parser.print_help()
 
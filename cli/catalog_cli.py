@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from lib.catalog_sync import sync_catalog_command
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catalog CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    subparsers.add_parser("sync", help="Apply catalog changes (new, changed and removed movies) to the index and embedding stores")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "sync":
+            sync_catalog_command()
+        case _:
+            parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,45 @@
 import argparse
 
-from lib.search_utils import DEFAULT_SEARCH_LIMIT
-from cli.lib.evaluation import evaluate_command
+from lib.search_utils import DEFAULT_SEARCH_LIMIT, EVALUATION_WORKERS, EVALUATION_CHECKPOINT_PATH, LATENCY_PERCENTILES
+from lib.evaluation import evaluate_command
 
 def main():
     parser = argparse.ArgumentParser(description="Search Evaluation CLI")
     parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of results to evaluate (k for precision@k, recall@k)")
+    parser.add_argument("--workers", type=int, default=EVALUATION_WORKERS, help=f"Test cases evaluated in parallel (default={EVALUATION_WORKERS})")
+    parser.add_argument("--rerank-method", type=str, choices=["individual", "batch", "cross_encoder"], help="Rerank the fused results before scoring them")
+    parser.add_argument("--checkpoint", type=str, default=EVALUATION_CHECKPOINT_PATH, help="File that records finished test cases so an interrupted run resumes")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and evaluate every test case again")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the query caches so latencies reflect cold searches")
 
     args = parser.parse_args()
     limit = args.limit
     
-    results = evaluate_command(limit)
+    report = evaluate_command(limit, args.workers, args.rerank_method, args.checkpoint, args.fresh, not args.no_cache)
 
     print(f"k={limit}\n")
 
-    for r in results:
+    for r in report.results:
         print(f"- Query: {r['query']}")
         print(f"  - Precision@{limit}: {r['precision']:.4f}")
         print(f"  - Recall@{limit}: {r['recall']:.4f}")
         print(f"  - F1 Score: {r['f1']:.4f}")
+        print(f"  - MRR: {r['mrr']:.4f}")
+        print(f"  - nDCG@{limit}: {r['ndcg']:.4f}")
+        print(f"  - Latency: {r['latency_ms']['total']:.1f}ms")
         print(f"  - Retrieved: {', '.join(r['retrieved'])}")
         print(f"  - Relevant: {', '.join(r['relevant'])}\n")
 
+    print(f"Evaluated {len(report.results)} test cases in {report.seconds:.2f}s ({report.resumed} resumed from checkpoint)")
+    print(f"  - Mean Precision@{limit}: {report.mean('precision'):.4f}")
+    print(f"  - Mean Recall@{limit}: {report.mean('recall'):.4f}")
+    print(f"  - Mean F1 Score: {report.mean('f1'):.4f}")
+    print(f"  - MRR: {report.mean('mrr'):.4f}")
+    print(f"  - Mean nDCG@{limit}: {report.mean('ndcg'):.4f}")
+
+    print("\nLatency (ms): " + ", ".join(f"p{p}" for p in LATENCY_PERCENTILES))
+    for stage, values in report.latency_percentiles().items():
+        print(f"  - {stage}: {', '.join(f'{v:.2f}' for v in values)}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -4,12 +4,16 @@ from lib.hybrid_search import (
     normalize,
     weighted_search,
     rrf_search,
+    adaptive_depth_command,
 )
 
 from lib.search_utils import (
     DEFAULT_SEARCH_LIMIT,
     DEFAULT_ALPHA,
     RRF_K,
+    CROSS_ENCODER_BACKENDS,
+    DEFAULT_CROSS_ENCODER_BACKEND,
+    CROSS_ENCODER_THREADS,
 ) 
 
 def main() -> None:
@@ -29,9 +33,15 @@ def main() -> None:
     rrf_search_parser.add_argument("--k", type=float, nargs='?', default=RRF_K, help="Weight parameter for RRF (default=60)")
     rrf_search_parser.add_argument("--enhance", type=str, choices=["spell", "rewrite", "expand"], help="Query enhancement method")
     rrf_search_parser.add_argument("--rerank-method", type=str, choices=["individual", "batch", "cross_encoder"], help="LLM reranks results")
+    rrf_search_parser.add_argument("--cross-encoder-backend", type=str, choices=CROSS_ENCODER_BACKENDS, default=DEFAULT_CROSS_ENCODER_BACKEND, help="Inference backend for cross_encoder reranking (default=torch)")
+    rrf_search_parser.add_argument("--cross-encoder-threads", type=int, default=CROSS_ENCODER_THREADS, help="CPU threads for cross_encoder reranking (0=library default)")
     rrf_search_parser.add_argument("--evaluate", action='store_true', default=True, help="LLM evaluation of results")
     rrf_search_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
     
+    adaptive_check_parser = subparsers.add_parser("adaptive-check", help="Compare adaptive and fixed RRF candidate depth on the golden dataset")
+    adaptive_check_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Number of returned resources (default=5)")
+    adaptive_check_parser.add_argument("--k", type=float, nargs='?', default=RRF_K, help="Weight parameter for RRF (default=60)")
+    
     args = parser.parse_args()
 
     match args.command:
@@ -40,7 +50,9 @@ def main() -> None:
         case "weighted-search":
             weighted_search(args.query, args.alpha, args.limit)
         case "rrf-search":
-            rrf_search(args.query, args.k, args.enhance, args.rerank_method, args.evaluate, args.limit)
+            rrf_search(args.query, args.k, args.enhance, args.rerank_method, args.evaluate, args.limit, args.cross_encoder_backend, args.cross_encoder_threads)
+        case "adaptive-check":
+            adaptive_depth_command(args.limit, args.k)
         case _:
             parser.print_help()
 
@@ -5,6 +5,7 @@ import argparse
 from lib.keyword_search import (
     search_command,
     build_command,
+    update_command,
     tf_command,
     idf_command,
     tf_idf_command,
@@ -17,6 +18,7 @@ from lib.search_utils import (
     BM25_K1,
     BM25_B,
     DEFAULT_SEARCH_LIMIT,
+    DEFAULT_INDEX_WORKERS,
 )
 
 def main() -> None:
@@ -26,7 +28,9 @@ def main() -> None:
     search_parser = subparsers.add_parser("search", help="Search movies using BM25")
     search_parser.add_argument("query", type=str, help="Search query")
 
-    subparsers.add_parser("build", help="Builds the inverted index and saves it to disk")
+    build_parser = subparsers.add_parser("build", help="Builds the inverted index and saves it to disk")
+    build_parser.add_argument("--workers", type=int, default=DEFAULT_INDEX_WORKERS, help=f"Processes used to tokenize the catalog, 0 for all cores (default={DEFAULT_INDEX_WORKERS})")
+    subparsers.add_parser("update", help="Applies new, changed and removed movies to the saved inverted index")
 
     tf_parser = subparsers.add_parser("tf", help="Prints the term frequency in the document with the given ID.")
     tf_parser.add_argument("doc_id", type=int, help="Document to look into")
@@ -66,8 +70,12 @@ def main() -> None:
                 print(f"{e}")
         case "build":
             print("Building inverted index...")
-            build_command()
-            print("Inverted index built successfully.")
+            stats = build_command(args.workers)
+            print(f"Inverted index built successfully: {stats}")
+        case "update":
+            print("Updating inverted index...")
+            diff = update_command()
+            print(f"Inverted index updated: {diff}")
         case "tf":
             try:
                 frequency = tf_command(args.doc_id, args.term)
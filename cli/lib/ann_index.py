@@ -0,0 +1,92 @@
+import math
+import numpy as np
+
+from .search_utils import (
+    IVF_N_PROBE,
+    IVF_KMEANS_ITERATIONS,
+    IVF_TRAINING_SAMPLES_PER_LIST,
+)
+from .vector_utils import l2_normalize
+from .embedding_store import EmbeddingStore
+
+ASSIGN_BLOCK_SIZE = 8192
+
+class ExactIndex:
+    def __init__(self, store: EmbeddingStore) -> None:
+        self.store = store
+
+    def candidates(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return np.arange(len(self.store)), self.store.scores(query)
+
+class IVFFlatIndex:
+    def __init__(self, vectors: np.ndarray, n_lists: int | None = None, n_probe: int = IVF_N_PROBE, seed: int = 0) -> None:
+        self.vectors = vectors
+        self.n_lists = n_lists or max(1, int(math.sqrt(len(vectors))))
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.list_offsets = None
+        self.list_ids = None
+
+    def train(self, iterations: int = IVF_KMEANS_ITERATIONS) -> None:
+        rng = np.random.default_rng(self.seed)
+        n_vectors = len(self.vectors)
+        self.n_lists = min(self.n_lists, n_vectors)
+        sample_size = min(n_vectors, self.n_lists * IVF_TRAINING_SAMPLES_PER_LIST)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(n_vectors, sample_size, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = assign_to_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        self.centroids = centroids
+
+    def add(self) -> None:
+        assignment = assign_to_centroids(self.vectors, self.centroids)
+        self.list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        counts = np.bincount(assignment, minlength=self.n_lists)
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def build(self) -> None:
+        self.train()
+        self.add()
+
+    def candidates(self, query: np.ndarray, n_probe: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        ids = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probed])
+        ids.sort()
+        return ids, self.vectors[ids] @ query
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+        )
+
+    @classmethod
+    def load(cls, path: str, vectors: np.ndarray, n_probe: int = IVF_N_PROBE) -> "IVFFlatIndex":
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            index = cls(vectors, n_lists=len(centroids), n_probe=n_probe)
+            index.centroids = centroids
+            index.list_offsets = data["list_offsets"]
+            index.list_ids = data["list_ids"]
+        if index.list_offsets[-1] != len(vectors):
+            raise ValueError("IVF index does not match the embeddings it was loaded with")
+        return index
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32)
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
@@ -1,23 +1,25 @@
-from .llm_request import perform_groq_request
-from .semantic_search import SemanticSearch
+import json, threading
+
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from .llm_request import perform_groq_request, stream_groq_request, TokenStream
 from .hybrid_search import HybridSearch
+from .catalog import open_catalog
+from .context_packing import ContextPacker, PackedContext
+from .search_client import search_server_url, request_search
 
 from .search_utils import (
-    load_movies,
     RRF_K,
     DEFAULT_SEARCH_LIMIT,
-    SEARCH_MULTIPLIER
+    SEARCH_MULTIPLIER,
+    RAG_BATCH_WORKERS,
+    RAG_CONTEXT_TOKENS,
 )
 
-def rag_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> tuple:
-    movies = load_movies()
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hs = HybridSearch(movies)
-
-    search_results = hs.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
-
-    prompt = f"""You are a RAG agent that provides a human answer
+def rag_prompt(query: str, context: str) -> str:
+    return f"""You are a RAG agent that provides a human answer
 to the user's query based on the documents that were retrieved during search.
 Answer the question or provide information based on the provided documents. 
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
@@ -26,44 +28,22 @@ Provide a comprehensive answer that addresses the query.
 Query: {query}
 
 Documents:
-{"\n".join([f"{i}: title - {r['title']}, document - {r['document'][:100]}" for i, r in enumerate(search_results[:limit], 1)])}"""
-    
-    response = perform_groq_request(prompt).strip()
-    results = [r["title"] for r in search_results[:limit]]
-    return results, response
-
-def summarize_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> tuple:
-    movies = load_movies()
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hs = HybridSearch(movies)
-
-    search_results = hs.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
+{context}"""
 
-    prompt = f"""
+def summarize_prompt(query: str, context: str) -> str:
+    return f"""
 Provide information useful to this query by synthesizing information from multiple search results in detail.
 The goal is to provide comprehensive information so that users know what their options are.
 Your response should be information-dense and concise, with several key pieces of information about the genre, plot, etc. of each movie.
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
 Query: {query}
 Search Results:
-{"\n".join([f"{i}: title - {r['title']}, document - {r['document'][:100]}" for i, r in enumerate(search_results[:limit], 1)])}
+{context}
 Provide a comprehensive 3–4 sentence answer that combines information from multiple sources.
 """
-    
-    response = perform_groq_request(prompt).strip()
-    results = [r["title"] for r in search_results[:limit]]
-    return results, response
 
-def citations_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> tuple:
-    movies = load_movies()
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hs = HybridSearch(movies)
-
-    search_results = hs.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
-
-    prompt = f"""Answer the question or provide information based on the provided documents.
+def citations_prompt(query: str, context: str) -> str:
+    return f"""Answer the question or provide information based on the provided documents.
 
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
 
@@ -72,7 +52,7 @@ If not enough information is available to give a good answer, say so but give as
 Query: {query}
 
 Documents:
-{"\n".join([f"{i}: title - {r['title']}, document - {r['document'][:100]}" for i, r in enumerate(search_results[:limit], 1)])}
+{context}
 
 Instructions:
 - Provide a comprehensive answer that addresses the query
@@ -82,27 +62,16 @@ Instructions:
 - Be direct and informative
 
 Answer:"""
-    
-    response = perform_groq_request(prompt).strip()
-    results = [r["title"] for r in search_results[:limit]]
-    return results, response
-
-def question_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> tuple:
-    movies = load_movies()
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hs = HybridSearch(movies)
 
-    search_results = hs.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
-
-    prompt = f"""Answer the user's question based on the provided movies that are available on Hoopla.
+def question_prompt(query: str, context: str) -> str:
+    return f"""Answer the user's question based on the provided movies that are available on Hoopla.
 
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
 
 Question: {query}
 
 Documents:
-{"\n".join([f"{i}: title - {r['title']}, document - {r['document']}" for i, r in enumerate(search_results[:limit], 1)])}
+{context}
 
 Instructions:
 - Answer questions directly and concisely
@@ -119,7 +88,123 @@ Guidance on types of questions:
 - Opinion-based questions: Acknowledge subjectivity and provide a balanced view
 
 Answer:"""
-    
-    response = perform_groq_request(prompt).strip()
-    results = [r["title"] for r in search_results[:limit]]
-    return results, response
\ No newline at end of file
+
+RAG_PROMPTS: dict[str, Callable[[str, str], str]] = {
+    "rag": rag_prompt,
+    "summarize": summarize_prompt,
+    "citations": citations_prompt,
+    "question": question_prompt,
+}
+
+class RAGPipeline:
+    def __init__(self, hybrid: HybridSearch | None = None, k: float = RRF_K, workers: int = RAG_BATCH_WORKERS, context_tokens: int = RAG_CONTEXT_TOKENS) -> None:
+        self.k = k
+        self.workers = workers
+        self.context_tokens = context_tokens
+        self._hybrid = hybrid
+        self._packers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hybrid(self) -> HybridSearch:
+        with self._lock:
+            if self._hybrid is None:
+                self._hybrid = HybridSearch(open_catalog())
+            return self._hybrid
+
+    def retrieve(self, query: str, limit: int) -> list[dict]:
+        if search_server_url():
+            return request_search("rrf_search", {"query": query, "k": self.k, "limit": limit})
+        return self.hybrid.rrf_search(query, self.k, limit)
+
+    def retrieve_many(self, queries: list[str], limit: int) -> list[list[dict]]:
+        if search_server_url():
+            return [self.retrieve(query, limit) for query in queries]
+        return self.hybrid.search_many(queries, "rrf", limit, self.k)
+
+    def chunk_scores(self, query: str, doc_ids: list[int]) -> dict[tuple[int, int], float]:
+        return self.hybrid.semantic_search.document_chunk_scores(query, doc_ids)
+
+    def packer(self, context_tokens: int | None = None) -> ContextPacker:
+        key = (self.context_tokens if context_tokens is None else context_tokens, bool(search_server_url()))
+        with self._lock:
+            if key not in self._packers:
+                budget, remote = key
+                self._packers[key] = ContextPacker(budget, None if remote else self.chunk_scores)
+            return self._packers[key]
+
+    def prompt(self, mode: str, query: str, search_results: list[dict], limit: int, context_tokens: int | None = None) -> tuple[str, PackedContext]:
+        context = self.packer(context_tokens).pack(query, search_results, limit)
+        return RAG_PROMPTS[mode](query, context.text), context
+
+    def generate(self, mode: str, query: str, search_results: list[dict], limit: int, context_tokens: int | None = None) -> tuple[list[str], str, PackedContext]:
+        prompt, context = self.prompt(mode, query, search_results, limit, context_tokens)
+        response = perform_groq_request(prompt).strip()
+        results = [r["title"] for r in search_results[:limit]]
+        return results, response, context
+
+    def answer(self, mode: str, query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int | None = None) -> tuple[list[str], str, PackedContext]:
+        return self.generate(mode, query, self.retrieve(query, limit * SEARCH_MULTIPLIER), limit, context_tokens)
+
+    def stream(self, mode: str, query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int | None = None) -> tuple[list[str], TokenStream, PackedContext]:
+        search_results = self.retrieve(query, limit * SEARCH_MULTIPLIER)
+        prompt, context = self.prompt(mode, query, search_results, limit, context_tokens)
+        return [r["title"] for r in search_results[:limit]], stream_groq_request(prompt), context
+
+    def answer_many(self, mode: str, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int | None = None) -> list[tuple[list[str], str, PackedContext]]:
+        retrieved = self.retrieve_many(queries, limit * SEARCH_MULTIPLIER)
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            return list(pool.map(lambda args: self.generate(mode, *args, limit, context_tokens), zip(queries, retrieved)))
+
+@lru_cache(maxsize=1)
+def default_pipeline() -> RAGPipeline:
+    return RAGPipeline()
+
+def retrieve_documents(query: str, limit: int) -> list[dict]:
+    return default_pipeline().retrieve(query, limit)
+
+def rag_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int = RAG_CONTEXT_TOKENS) -> tuple:
+    return default_pipeline().answer("rag", query, limit, context_tokens)
+
+def summarize_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int = RAG_CONTEXT_TOKENS) -> tuple:
+    return default_pipeline().answer("summarize", query, limit, context_tokens)
+
+def citations_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int = RAG_CONTEXT_TOKENS) -> tuple:
+    return default_pipeline().answer("citations", query, limit, context_tokens)
+
+def question_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int = RAG_CONTEXT_TOKENS) -> tuple:
+    return default_pipeline().answer("question", query, limit, context_tokens)
+
+def stream_command(mode: str, query: str, limit: int = DEFAULT_SEARCH_LIMIT, context_tokens: int = RAG_CONTEXT_TOKENS) -> tuple[list[str], TokenStream, PackedContext]:
+    return default_pipeline().stream(mode, query, limit, context_tokens)
+
+def print_stream_stats(tokens: TokenStream) -> None:
+    ttft = tokens.time_to_first_token
+    rate = tokens.tokens_per_second
+    source = " (cached)" if tokens.cached else ""
+    print(f"\nTime to first token: {'n/a' if ttft is None else f'{ttft:.3f}s'}{source}")
+    print(f"Tokens: {tokens.tokens}, {'n/a' if rate is None else f'{rate:.1f}'} tokens/sec")
+
+def print_context_stats(context: PackedContext) -> None:
+    print(f"\nContext: {context}")
+
+def read_questions(lines: Iterable[str]) -> list[str]:
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+def batch_command(mode: str, questions: list[str], limit: int = DEFAULT_SEARCH_LIMIT, output: str | None = None, context_tokens: int = RAG_CONTEXT_TOKENS) -> None:
+    answers = default_pipeline().answer_many(mode, questions, limit, context_tokens)
+    if output:
+        with open(output, "w") as f:
+            for question, (results, response, context) in zip(questions, answers):
+                f.write(json.dumps({"mode": mode, "question": question, "results": results, "response": response, "context_tokens": context.tokens}) + "\n")
+        print(f"Wrote {len(answers)} {mode} answers to {output}")
+        return
+
+    for i, (question, (results, response, context)) in enumerate(zip(questions, answers), 1):
+        print(f"\n[{i}/{len(questions)}] {question}")
+        print("Search Results:")
+        for r in results:
+            print(f"  - {r}")
+        print(f"Context: {context}")
+        print("\nAnswer:")
+        print(response)
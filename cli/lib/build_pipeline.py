@@ -0,0 +1,61 @@
+import queue, threading
+
+import numpy as np
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+from .search_utils import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_QUEUE_DEPTH,
+)
+from .vector_utils import l2_normalize
+
+@dataclass
+class BuildStats:
+    documents: int
+    items: int
+    seconds: float
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.documents} docs -> {self.items} items in {self.seconds:.2f}s ({self.docs_per_sec:.1f} docs/sec)"
+
+def batch_stream(records: Iterable[tuple[str, dict | None]], batch_size: int = EMBEDDING_BATCH_SIZE) -> Iterator[list[tuple[str, dict | None]]]:
+    batches = queue.Queue(maxsize=EMBEDDING_QUEUE_DEPTH)
+    done = object()
+
+    def produce() -> None:
+        try:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+            batches.put(done)
+        except BaseException as e:
+            batches.put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    while (batch := batches.get()) is not done:
+        if isinstance(batch, BaseException):
+            raise batch
+        yield batch
+    producer.join()
+
+def encode_stream(model, records: Iterable[tuple[str, dict | None]], batch_size: int = EMBEDDING_BATCH_SIZE) -> tuple[np.ndarray, list[dict | None]]:
+    embeddings, metadata = [], []
+    for batch in batch_stream(records, batch_size):
+        texts = [text for text, _ in batch]
+        embeddings.append(l2_normalize(model.encode(texts, batch_size=batch_size)))
+        metadata.extend(meta for _, meta in batch)
+    if not embeddings:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32), []
+    return np.concatenate(embeddings), metadata
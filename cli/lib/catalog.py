@@ -0,0 +1,235 @@
+import os, re, json, mmap, hashlib
+import numpy as np
+
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass, field
+
+from .search_utils import (
+    CACHE_DIR,
+    DATA_PATH,
+    CATALOG_READ_CHUNK_SIZE,
+    save_array,
+)
+from .query_cache import bump_index_version
+
+CATALOG_DIR = os.path.join(CACHE_DIR, "catalog")
+RECORDS_FILE = "records.jsonl"
+RECORD_IDS_FILE = "ids.npy"
+RECORD_OFFSETS_FILE = "offsets.npy"
+RECORD_HASHES_FILE = "hashes.npy"
+CATALOG_SOURCE_FILE = "source.json"
+
+SEPARATORS = re.compile(r"[\s,]*")
+
+@dataclass
+class CatalogDiff:
+    added: list[int] = field(default_factory=list)
+    changed: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    @property
+    def stale(self) -> set[int]:
+        return set(self.changed) | set(self.removed)
+
+    @property
+    def fresh(self) -> list[int]:
+        return self.added + self.changed
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+class RecordStore(Sequence):
+    def __init__(self, directory: str, start: int = 0, stop: int | None = None) -> None:
+        self.directory = directory
+        self.ids = np.load(os.path.join(directory, RECORD_IDS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, RECORD_OFFSETS_FILE), mmap_mode="r")
+        self.record_hashes = np.load(os.path.join(directory, RECORD_HASHES_FILE), mmap_mode="r")
+        self.start = start
+        self.stop = len(self.ids) if stop is None else stop
+        self._id_order = None
+        with open(os.path.join(directory, RECORDS_FILE), "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] > 0 else b""
+
+    def __getstate__(self) -> dict:
+        return {"directory": self.directory, "start": self.start, "stop": self.stop}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            view = RecordStore.__new__(RecordStore)
+            view.__dict__.update(self.__dict__)
+            view.start, view.stop = self.start + start, self.start + max(start, stop)
+            return view
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        return self._decode(self.start + i)
+
+    def __iter__(self) -> Iterator[dict]:
+        for pos in range(self.start, self.stop):
+            yield self._decode(pos)
+
+    def _decode(self, pos: int) -> dict:
+        return json.loads(self._records[int(self.offsets[pos]):int(self.offsets[pos + 1])])
+
+    def position(self, doc_id: int) -> int | None:
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        i = int(np.searchsorted(self.ids, doc_id, sorter=self._id_order))
+        if i < len(self._id_order):
+            pos = int(self._id_order[i])
+            if self.ids[pos] == doc_id and self.start <= pos < self.stop:
+                return pos
+        return None
+
+    def get(self, doc_id: int, default: dict | None = None) -> dict | None:
+        pos = self.position(doc_id)
+        return default if pos is None else self._decode(pos)
+
+    @property
+    def by_id(self) -> "RecordsById":
+        return RecordsById(self)
+
+    def document_ids(self) -> list[int]:
+        return self.ids[self.start:self.stop].tolist()
+
+    def hashes(self) -> dict[int, str]:
+        return {
+            doc_id: h.decode()
+            for doc_id, h in zip(self.document_ids(), self.record_hashes[self.start:self.stop].tolist())
+        }
+
+class RecordsById(Mapping):
+    def __init__(self, store: RecordStore) -> None:
+        self.store = store
+
+    def __getitem__(self, doc_id: int) -> dict:
+        pos = self.store.position(doc_id)
+        if pos is None:
+            raise KeyError(doc_id)
+        return self.store._decode(pos)
+
+    def __contains__(self, doc_id) -> bool:
+        return self.store.position(doc_id) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.store.document_ids())
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+def write_record_store(directory: str, records: Iterable[dict]) -> RecordStore:
+    os.makedirs(directory, exist_ok=True)
+    ids, offsets, hashes = [], [0], []
+    records_path = os.path.join(directory, RECORDS_FILE)
+    with open(f"{records_path}.tmp", "wb") as f:
+        for record in records:
+            line = json.dumps(record).encode("utf-8") + b"\n"
+            f.write(line)
+            ids.append(int(record["id"]))
+            offsets.append(offsets[-1] + len(line))
+            hashes.append(document_hash(record))
+    os.replace(f"{records_path}.tmp", records_path)
+    save_array(os.path.join(directory, RECORD_IDS_FILE), np.array(ids, dtype=np.int64))
+    save_array(os.path.join(directory, RECORD_OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+    save_array(os.path.join(directory, RECORD_HASHES_FILE), np.array(hashes, dtype="S40"))
+    return RecordStore(directory)
+
+def iter_json_records(path: str, key: str, chunk_size: int = CATALOG_READ_CHUNK_SIZE) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    array_start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while (match := array_start.search(buffer)) is None:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"No '{key}' array found in {path}")
+            buffer += chunk
+        pos = match.end()
+
+        while True:
+            pos = SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                # compact only when reading, so each record is not a copy of the rest of the chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield record
+
+def open_catalog(path: str = DATA_PATH, directory: str = CATALOG_DIR) -> RecordStore:
+    stat = os.stat(path)
+    source = {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    source_path = os.path.join(directory, CATALOG_SOURCE_FILE)
+    try:
+        with open(source_path, "r") as f:
+            if json.load(f) == source:
+                return RecordStore(directory)
+    except (OSError, ValueError):
+        pass
+
+    store = write_record_store(directory, iter_json_records(path, "movies"))
+    with open(source_path, "w") as f:
+        json.dump(source, f)
+    bump_index_version("catalog")
+    return store
+
+def document_map(documents: Iterable[dict]) -> Mapping[int, dict]:
+    if isinstance(documents, RecordStore):
+        return documents.by_id
+    return {int(doc["id"]): doc for doc in documents}
+
+def document_ids(documents: Iterable[dict]) -> list[int]:
+    if isinstance(documents, RecordStore):
+        return documents.document_ids()
+    return [int(doc["id"]) for doc in documents]
+
+def document_hash(doc: dict) -> str:
+    return hashlib.sha1(json.dumps(doc, sort_keys=True).encode("utf-8")).hexdigest()
+
+def catalog_hashes(documents: Iterable[dict]) -> dict[int, str]:
+    if isinstance(documents, RecordStore):
+        return documents.hashes()
+    return {int(doc["id"]): document_hash(doc) for doc in documents}
+
+def catalog_fingerprint(hashes: dict[int, str]) -> str:
+    digest = hashlib.sha1()
+    for doc_id in sorted(hashes):
+        digest.update(f"{doc_id}:{hashes[doc_id]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def diff_catalog(documents: Iterable[dict], known_hashes: dict[int, str]) -> CatalogDiff:
+    diff = CatalogDiff()
+    current = catalog_hashes(documents)
+    for doc_id, h in current.items():
+        known = known_hashes.get(doc_id)
+        if known is None:
+            diff.added.append(doc_id)
+        elif known != h:
+            diff.changed.append(doc_id)
+    diff.removed = sorted(doc_id for doc_id in known_hashes if doc_id not in current)
+    return diff
+
+def hashes_to_manifest(hashes: dict[int, str]) -> dict:
+    return {"ids": list(hashes.keys()), "hashes": list(hashes.values())}
+
+def hashes_from_manifest(manifest: dict) -> dict[int, str]:
+    return {int(doc_id): h for doc_id, h in zip(manifest["ids"], manifest["hashes"])}
@@ -0,0 +1,22 @@
+import time
+
+from .keyword_search import update_command as update_index_command
+from .semantic_search import ChunkedSemanticSearch
+from .catalog import open_catalog
+
+def sync_catalog_command() -> None:
+    movies = open_catalog()
+    print(f"Catalog: {len(movies)} movies")
+
+    start = time.perf_counter()
+    diff = update_index_command()
+    print(f"Inverted index:   {diff} ({time.perf_counter() - start:.2f}s)")
+
+    semantic = ChunkedSemanticSearch()
+    start = time.perf_counter()
+    semantic.load_or_create_embeddings(movies)
+    print(f"Movie embeddings: {semantic.last_embeddings_sync} ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    semantic.load_or_create_chunk_embeddings(movies)
+    print(f"Chunk embeddings: {semantic.last_chunk_sync} ({time.perf_counter() - start:.2f}s)")
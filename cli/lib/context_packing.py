@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import lru_cache
+from transformers import AutoTokenizer
+
+from .semantic_search import chunk_sentences
+from .search_utils import (
+    RAG_CONTEXT_TOKENS,
+    RAG_TOKENIZER_MODEL,
+    MAX_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+)
+
+_tokenizer_lock = threading.Lock()
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    budget: int
+    chunks: int
+    documents: int
+    skipped: int = 0
+    duplicates: int = 0
+    titles: list[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.tokens}/{self.budget} context tokens from {self.chunks} chunks across {self.documents} documents"
+            f" ({self.duplicates} overlapping chunks merged, {self.skipped} over budget)"
+        )
+
+class ContextPacker:
+    def __init__(self, budget: int = RAG_CONTEXT_TOKENS, chunk_scorer: Callable[[str, list[int]], dict[tuple[int, int], float]] | None = None, tokenizer_model: str = RAG_TOKENIZER_MODEL) -> None:
+        self.budget = budget
+        self.chunk_scorer = chunk_scorer
+        self.tokenizer_model = tokenizer_model
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.tokenizer_model)
+
+    def pack(self, query: str, search_results: list[dict], limit: int) -> PackedContext:
+        documents = search_results[:limit]
+        sentences = [document_sentences(r["document"]) for r in documents]
+        candidates = self._ranked_chunks(query, documents)
+
+        selected = [set() for _ in documents]
+        packed = PackedContext(self._render(documents, sentences, selected), 0, self.budget, 0, 0)
+        packed.tokens = self.count_tokens(packed.text)
+        for doc_pos, span in candidates:
+            new = set(span) - selected[doc_pos]
+            if not new:
+                packed.duplicates += 1
+                continue
+            selected[doc_pos] |= new
+            text = self._render(documents, sentences, selected)
+            tokens = self.count_tokens(text)
+            if tokens > self.budget:
+                selected[doc_pos] -= new
+                packed.skipped += 1
+                continue
+            if len(new) < len(span):
+                packed.duplicates += 1
+            packed.text, packed.tokens = text, tokens
+            packed.chunks += 1
+
+        packed.documents = sum(1 for s in selected if s)
+        packed.titles = [r["title"] for r, s in zip(documents, selected) if s]
+        return packed
+
+    def _ranked_chunks(self, query: str, documents: list[dict]) -> list[tuple[int, range]]:
+        chunks, order = [], []
+        for doc_pos, r in enumerate(documents):
+            for chunk_idx, span in enumerate(chunk_spans(len(document_sentences(r["document"])))):
+                chunks.append((doc_pos, span))
+                order.append((r["id"], chunk_idx))
+        if self.chunk_scorer is None or not chunks:
+            return chunks
+
+        scores = self.chunk_scorer(query, [r["id"] for r in documents])
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores.get(order[i], -np.inf), i))
+        return [chunks[i] for i in ranked]
+
+    def _render(self, documents: list[dict], sentences: list[list[str]], selected: list[set[int]]) -> str:
+        lines = []
+        for r, doc_sentences, chosen in zip(documents, sentences, selected):
+            if not chosen:
+                continue
+            lines.append(f"{len(lines) + 1}: title - {r['title']}, document - {join_excerpts(doc_sentences, chosen)}")
+        return "\n".join(lines)
+
+def document_sentences(text: str) -> list[str]:
+    return chunk_sentences(text, max_chunk_size=1, overlap=0)
+
+def chunk_spans(n_sentences: int, max_chunk_size: int = MAX_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> list[range]:
+    step = max(1, max_chunk_size - overlap)
+    return [range(i, min(i + max_chunk_size, n_sentences)) for i in range(0, n_sentences, step)]
+
+def join_excerpts(sentences: list[str], chosen: set[int]) -> str:
+    parts, previous = [], None
+    for i in sorted(chosen):
+        if previous is not None and i != previous + 1:
+            parts.append("...")
+        parts.append(sentences[i])
+        previous = i
+    return " ".join(parts)
+
+@lru_cache(maxsize=None)
+def context_tokenizer(model_name: str = RAG_TOKENIZER_MODEL):
+    return AutoTokenizer.from_pretrained(model_name)
+
+def count_tokens(text: str, model_name: str = RAG_TOKENIZER_MODEL) -> int:
+    if not text:
+        return 0
+    tokenizer = context_tokenizer(model_name)
+    with _tokenizer_lock:
+        return len(tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
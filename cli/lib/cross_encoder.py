@@ -0,0 +1,89 @@
+import numpy as np
+
+from functools import lru_cache
+
+from sentence_transformers import CrossEncoder
+
+from .search_utils import (
+    CROSS_ENCODER_MODEL,
+    CROSS_ENCODER_BACKENDS,
+    DEFAULT_CROSS_ENCODER_BACKEND,
+    CROSS_ENCODER_ONNX_INT8_FILE,
+    CROSS_ENCODER_BATCH_SIZE,
+    CROSS_ENCODER_MAX_LENGTH,
+    CROSS_ENCODER_THREADS,
+    CROSS_ENCODER_CACHE_SIZE,
+)
+from .query_cache import MISSING, open_query_cache, normalize_query
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL, backend: str = DEFAULT_CROSS_ENCODER_BACKEND, threads: int = CROSS_ENCODER_THREADS, batch_size: int = CROSS_ENCODER_BATCH_SIZE, max_length: int = CROSS_ENCODER_MAX_LENGTH, cache_mode: str | None = None) -> None:
+        if backend not in CROSS_ENCODER_BACKENDS:
+            raise ValueError(f"Unknown cross-encoder backend '{backend}', expected one of {CROSS_ENCODER_BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.model = load_cross_encoder(model_name, backend, threads, max_length)
+        self.score_cache = open_query_cache("cross_encoder_scores", CROSS_ENCODER_CACHE_SIZE, mode=cache_mode)
+
+    def score(self, query: str, results: list[dict]) -> np.ndarray:
+        query = normalize_query(query)
+        keys = [(self.model_name, self.backend, query, r["id"]) for r in results]
+        scores = np.zeros(len(results), dtype=np.float32)
+        misses = []
+        for i, key in enumerate(keys):
+            cached = MISSING if self.score_cache is None else self.score_cache.get(key)
+            if cached is MISSING:
+                misses.append(i)
+            else:
+                scores[i] = cached
+        if not misses:
+            return scores
+
+        texts = {i: document_text(results[i]) for i in misses}
+        order = sorted(misses, key=lambda i: len(texts[i]))
+        predicted = self.model.predict(
+            [[query, texts[i]] for i in order],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        for i, score in zip(order, np.asarray(predicted, dtype=np.float32)):
+            scores[i] = score
+            if self.score_cache is not None:
+                self.score_cache.put(keys[i], float(score))
+        return scores
+
+    def rerank(self, query: str, results: list[dict], limit: int) -> list[dict]:
+        scores = self.score(query, results)
+        for res, score in zip(results, scores.tolist()):
+            res["metadata"]["cross_encoder_score"] = score
+        order = sorted(range(len(results)), key=lambda i: -scores[i])
+        return [results[i] for i in order[:limit]]
+
+def document_text(res: dict) -> str:
+    return f"{res.get('title', '')} - {res.get('document', '')}"
+
+@lru_cache(maxsize=None)
+def load_cross_encoder(model_name: str, backend: str, threads: int, max_length: int) -> CrossEncoder:
+    match backend:
+        case "torch":
+            if threads > 0:
+                import torch
+                torch.set_num_threads(threads)
+            return CrossEncoder(model_name, max_length=max_length, device="cpu")
+        case "onnx" | "onnx-int8":
+            try:
+                import onnxruntime
+            except ImportError as e:
+                raise RuntimeError("The onnx cross-encoder backends need onnxruntime: pip install 'sentence-transformers[onnx]'") from e
+            session_options = onnxruntime.SessionOptions()
+            if threads > 0:
+                session_options.intra_op_num_threads = threads
+            model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+            if backend == "onnx-int8":
+                model_kwargs["file_name"] = CROSS_ENCODER_ONNX_INT8_FILE
+            return CrossEncoder(model_name, max_length=max_length, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+@lru_cache(maxsize=None)
+def get_cross_encoder(backend: str = DEFAULT_CROSS_ENCODER_BACKEND, threads: int = CROSS_ENCODER_THREADS, cache_mode: str | None = None) -> CrossEncoderReranker:
+    return CrossEncoderReranker(backend=backend, threads=threads, cache_mode=cache_mode)
@@ -0,0 +1,98 @@
+import os
+import numpy as np
+
+from .search_utils import (
+    EMBEDDING_DTYPES,
+    DEFAULT_EMBEDDING_DTYPE,
+    SCORE_BLOCK_SIZE,
+    save_array,
+)
+
+INT8_MAX = 127
+
+class EmbeddingStore:
+    def __init__(self, vectors: np.ndarray, dtype: str = DEFAULT_EMBEDDING_DTYPE, codes: np.ndarray | None = None, scales: np.ndarray | None = None) -> None:
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype '{dtype}', expected one of {EMBEDDING_DTYPES}")
+        self.vectors = vectors
+        self.dtype = dtype
+        if codes is None:
+            codes, scales = quantize(vectors, dtype)
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype != "float32"
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def scores(self, queries: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.scales is not None:
+            queries = queries * self.scales
+        return score_blocks(self.codes if ids is None else self.codes[ids], queries)
+
+    def exact_scores(self, queries: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        return score_blocks(self.vectors if ids is None else self.vectors[ids], np.asarray(queries, dtype=np.float32))
+
+    def save(self, path: str) -> None:
+        save_array(path, np.asarray(self.vectors, dtype=np.float32))
+        for dtype in EMBEDDING_DTYPES[1:]:
+            for sidecar in quantized_paths(path, dtype):
+                if os.path.exists(sidecar):
+                    os.remove(sidecar)
+        self.save_codes(path)
+
+    def save_codes(self, path: str) -> None:
+        if not self.quantized:
+            return
+        codes_path, scales_path = quantized_paths(path, self.dtype)
+        save_array(codes_path, self.codes)
+        if self.scales is not None:
+            save_array(scales_path, self.scales)
+
+    @classmethod
+    def open(cls, path: str, dtype: str = DEFAULT_EMBEDDING_DTYPE) -> "EmbeddingStore":
+        vectors = np.load(path, mmap_mode="r")
+        if dtype == "float32":
+            return cls(vectors, dtype, vectors)
+
+        codes_path, scales_path = quantized_paths(path, dtype)
+        try:
+            codes = np.load(codes_path, mmap_mode="r")
+            scales = np.load(scales_path) if dtype == "int8" else None
+            if codes.shape == vectors.shape:
+                return cls(vectors, dtype, codes, scales)
+        except OSError:
+            pass
+        store = cls(vectors, dtype)
+        store.save_codes(path)
+        return store
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    match dtype:
+        case "float32":
+            return vectors, None
+        case "float16":
+            return np.asarray(vectors, dtype=np.float16), None
+        case "int8":
+            vectors = np.asarray(vectors, dtype=np.float32)
+            scales = np.abs(vectors).max(axis=0) / INT8_MAX if len(vectors) else np.ones(vectors.shape[1], dtype=np.float32)
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales), -INT8_MAX, INT8_MAX).astype(np.int8)
+            return codes, scales.astype(np.float32)
+
+def quantized_paths(path: str, dtype: str) -> tuple[str, str]:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{dtype}{ext}", f"{root}.{dtype}_scales{ext}"
+
+def score_blocks(rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    blocks = [
+        np.asarray(rows[start:start + SCORE_BLOCK_SIZE], dtype=np.float32) @ queries.T
+        for start in range(0, len(rows), SCORE_BLOCK_SIZE)
+    ]
+    if not blocks:
+        return np.zeros(queries.shape[:-1] + (0,), dtype=np.float32)
+    return np.concatenate(blocks).T
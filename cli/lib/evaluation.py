@@ -1,42 +1,163 @@
+import os, json, math, time, hashlib, threading
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
 from .hybrid_search import HybridSearch
-from .semantic_search import SemanticSearch
+from .catalog import open_catalog
+from .reranking import rerank_results
+from .cross_encoder import CrossEncoderReranker, get_cross_encoder
+from .query_cache import index_version
+from .stage_timing import STAGES, record_stages
 
 from .search_utils import (
-    load_movies,
     load_test_cases,
     DEFAULT_SEARCH_LIMIT,
-    RRF_K
+    SEARCH_MULTIPLIER,
+    RRF_K,
+    EVALUATION_WORKERS,
+    EVALUATION_CHECKPOINT_PATH,
+    LATENCY_PERCENTILES,
 )
 
-def evaluate_command(limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-    test_cases = load_test_cases()
+@dataclass
+class EvaluationReport:
+    limit: int
+    results: list[dict]
+    resumed: int = 0
+    seconds: float = 0.0
+
+    def mean(self, metric: str) -> float:
+        return float(np.mean([r[metric] for r in self.results])) if self.results else 0.0
+
+    def latency_percentiles(self) -> dict[str, list[float]]:
+        recorded = [stage for stage in ("total", *STAGES) if any(stage in r["latency_ms"] for r in self.results)]
+        return {
+            stage: np.percentile([r["latency_ms"].get(stage, 0.0) for r in self.results], LATENCY_PERCENTILES).tolist()
+            for stage in recorded
+        }
+
+class EvaluationCheckpoint:
+    def __init__(self, path: str, run_key: str, fresh: bool = False, total: int | None = None) -> None:
+        self.path = path
+        self.run_key = run_key
+        self._lock = threading.Lock()
+        self.completed = {} if fresh else self._load()
+        if total is not None and len(self.completed) >= total:
+            # a finished run has nothing to resume; rerun so timings reflect the current code
+            self.completed = {}
+        if not self.completed:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(json.dumps({"run": run_key}) + "\n")
+
+    def _load(self) -> dict[int, dict]:
+        completed = {}
+        try:
+            with open(self.path, "r") as f:
+                lines = iter(f)
+                header = json.loads(next(lines, "{}"))
+                if header.get("run") != self.run_key:
+                    return {}
+                for line in lines:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    completed[result["case"]] = result
+        except (OSError, ValueError):
+            return {}
+        return completed
+
+    def append(self, result: dict) -> None:
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+class EvaluationEngine:
+    def __init__(self, hybrid: HybridSearch, limit: int = DEFAULT_SEARCH_LIMIT, k: float = RRF_K, rerank_method: Optional[str] = None, workers: int = EVALUATION_WORKERS, cross_encoder: Optional[CrossEncoderReranker] = None) -> None:
+        self.hybrid = hybrid
+        self.limit = limit
+        self.k = k
+        self.rerank_method = rerank_method
+        self.workers = workers
+        self.cross_encoder = cross_encoder
+
+    def run_key(self, test_cases: list[dict]) -> str:
+        config = {
+            "limit": self.limit,
+            "k": self.k,
+            "rerank_method": self.rerank_method,
+            "search": self.hybrid.search_config(),
+            "index_version": index_version(),
+            "test_cases": test_cases,
+        }
+        return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
 
-    movies = load_movies()
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hs = HybridSearch(movies)
-
-    test_results = []
-    for c in test_cases:
-        query = c["query"]
-        results = hs.rrf_search(query, RRF_K, limit)
-        relevant_retrieved = set()
-        relevant_set = set(c["relevant_docs"])
-
-        for res in results:
-            if res["title"] in relevant_set:
-                relevant_retrieved.add(res["title"])
-        precision = len(relevant_retrieved) / limit
-        recall = len(relevant_retrieved) / len(relevant_set)
-        f1 = 2 * (precision * recall) / (precision + recall)
-
-        test_results.append({
+    def evaluate_case(self, i: int, case: dict) -> dict:
+        query = case["query"]
+        search_limit = self.limit * SEARCH_MULTIPLIER if self.rerank_method else self.limit
+        start = time.perf_counter()
+        with record_stages() as timings:
+            results = self.hybrid.rrf_search(query, self.k, search_limit)
+            if self.rerank_method:
+                results = rerank_results(query, results, self.rerank_method, self.limit, cross_encoder=self.cross_encoder)
+        total = time.perf_counter() - start
+
+        retrieved = [r["title"] for r in results[:self.limit]]
+        latency_ms = {"total": total * 1000, **{stage: seconds * 1000 for stage, seconds in timings.as_dict().items()}}
+        return {
+            "case": i,
             "query": query,
-            "precision": precision,
-            "recall": recall,
-            "f1": f1,
-            "retrieved": [r["title"] for r in results],
-            "relevant": c["relevant_docs"],
-        })
-    
-    return test_results
\ No newline at end of file
+            **score_retrieval(retrieved, case["relevant_docs"], self.limit),
+            "retrieved": retrieved,
+            "relevant": case["relevant_docs"],
+            "latency_ms": latency_ms,
+        }
+
+    def run(self, test_cases: list[dict], checkpoint: Optional[EvaluationCheckpoint] = None) -> EvaluationReport:
+        start = time.perf_counter()
+        completed = dict(checkpoint.completed) if checkpoint is not None else {}
+        resumed = len(completed)
+        pending = [(i, case) for i, case in enumerate(test_cases) if i not in completed]
+
+        pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="evaluation")
+        try:
+            futures = [pool.submit(self.evaluate_case, i, case) for i, case in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                completed[result["case"]] = result
+                if checkpoint is not None:
+                    checkpoint.append(result)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        results = [completed[i] for i in sorted(completed)]
+        return EvaluationReport(self.limit, results, resumed, time.perf_counter() - start)
+
+def score_retrieval(retrieved: list[str], relevant: list[str], limit: int) -> dict[str, float]:
+    relevant_set = set(relevant)
+    hits = [title in relevant_set for title in retrieved[:limit]]
+    relevant_retrieved = len(relevant_set.intersection(retrieved[:limit]))
+
+    precision = relevant_retrieved / limit if limit else 0.0
+    recall = relevant_retrieved / len(relevant_set) if relevant_set else 0.0
+    f1 = 2 * (precision * recall) / (precision + recall) if precision + recall else 0.0
+    mrr = next((1 / rank for rank, hit in enumerate(hits, 1) if hit), 0.0)
+    dcg = sum(1 / math.log2(rank + 1) for rank, hit in enumerate(hits, 1) if hit)
+    idcg = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(relevant_set), limit) + 1))
+    ndcg = dcg / idcg if idcg else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "mrr": mrr, "ndcg": ndcg}
+
+def evaluate_command(limit: int = DEFAULT_SEARCH_LIMIT, workers: int = EVALUATION_WORKERS, rerank_method: Optional[str] = None, checkpoint_path: Optional[str] = EVALUATION_CHECKPOINT_PATH, fresh: bool = False, use_cache: bool = True) -> EvaluationReport:
+    test_cases = load_test_cases()
+    cache_mode = None if use_cache else "off"
+
+    # cases share the leg pool, so queueing must not trip the per-query leg deadline
+    hs = HybridSearch(open_catalog(), leg_timeout=None, cache_mode=cache_mode)
+    cross_encoder = get_cross_encoder(cache_mode=cache_mode) if rerank_method == "cross_encoder" else None
+    engine = EvaluationEngine(hs, limit, RRF_K, rerank_method, workers, cross_encoder)
+    checkpoint = EvaluationCheckpoint(checkpoint_path, engine.run_key(test_cases), fresh, len(test_cases)) if checkpoint_path else None
+    return engine.run(test_cases, checkpoint)
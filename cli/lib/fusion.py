@@ -0,0 +1,83 @@
+import numpy as np
+
+from dataclasses import dataclass, field
+
+from .vector_utils import top_k_indices
+
+@dataclass
+class FusedRanking:
+    ids: np.ndarray
+    scores: np.ndarray
+    metadata: dict[str, np.ndarray] = field(default_factory=dict)
+    settled: bool = True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def metadata_at(self, i: int) -> dict:
+        return {key: to_metadata_value(values[i]) for key, values in self.metadata.items()}
+
+def to_metadata_value(value):
+    if np.issubdtype(type(value), np.integer):
+        return int(value) if value > 0 else None
+    return float(value)
+
+def min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+    min_x, max_x = scores.min(), scores.max()
+    if min_x == max_x:
+        return np.ones_like(scores)
+    return (scores - min_x) / (max_x - min_x)
+
+def align_legs(bm_ids: np.ndarray, sem_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    bm_ids = np.asarray(bm_ids, dtype=np.int64)
+    sem_ids = np.asarray(sem_ids, dtype=np.int64)
+    ids = np.concatenate([bm_ids, sem_ids[~np.isin(sem_ids, bm_ids)]])
+    order = np.argsort(ids, kind="stable")
+    sem_slots = order[np.searchsorted(ids, sem_ids, sorter=order)]
+    return ids, np.arange(len(bm_ids)), sem_slots
+
+def weighted_fusion(bm_ids: np.ndarray, bm_scores: np.ndarray, sem_ids: np.ndarray, sem_scores: np.ndarray, alpha: float, limit: int) -> FusedRanking:
+    ids, bm_slots, sem_slots = align_legs(bm_ids, sem_ids)
+    bm_norm = np.zeros(len(ids))
+    bm_norm[bm_slots] = min_max_normalize(bm_scores)
+    sem_norm = np.zeros(len(ids))
+    sem_norm[sem_slots] = min_max_normalize(sem_scores)
+    fused = alpha * bm_norm + (1 - alpha) * sem_norm
+    return top_fused(ids, fused, fused_top_k(fused, limit), bm25_score=bm_norm, semantic_score=sem_norm)
+
+def rrf_fusion(bm_ids: np.ndarray, sem_ids: np.ndarray, k: float, limit: int, open_legs: tuple[bool, bool] = (False, False)) -> FusedRanking:
+    ids, bm_slots, sem_slots = align_legs(bm_ids, sem_ids)
+    fused = np.zeros(len(ids))
+    ranks = []
+    for slots in (bm_slots, sem_slots):
+        leg_ranks = np.zeros(len(ids), dtype=np.int64)
+        leg_ranks[slots] = np.arange(1, len(slots) + 1)
+        fused[slots] += 1 / (k + leg_ranks[slots])
+        ranks.append(leg_ranks)
+    top = fused_top_k(fused, limit)
+    ranking = top_fused(ids, fused, top, bm25_rank=ranks[0], semantic_rank=ranks[1])
+    ranking.settled = rrf_settled(fused, ranks, top, k, limit, open_legs)
+    return ranking
+
+def rrf_settled(fused: np.ndarray, ranks: list[np.ndarray], top: np.ndarray, k: float, limit: int, open_legs: tuple[bool, bool]) -> bool:
+    # Threshold-algorithm stop: a leg cut at depth d can add at most 1/(k+d+1) to a
+    # document it has not returned yet. The top-k and its order are final once every
+    # known score beats the upper bound of each unfinished document ranked below it.
+    if len(top) < limit:
+        return not any(open_legs)
+    bounds = [1 / (k + np.count_nonzero(leg_ranks) + 1) if is_open else 0.0 for leg_ranks, is_open in zip(ranks, open_legs)]
+    headroom = sum((leg_ranks == 0) * bound for leg_ranks, bound in zip(ranks, bounds))
+    upper = np.where(headroom > 0, fused + headroom, -np.inf)
+    top_upper = upper[top]
+    upper[top] = -np.inf
+    below = np.maximum.accumulate(np.r_[top_upper[1:], max(sum(bounds), upper.max(initial=-np.inf))][::-1])[::-1]
+    return bool(np.all(fused[top] > below))
+
+def fused_top_k(fused: np.ndarray, limit: int) -> np.ndarray:
+    return top_k_indices(fused, limit, np.arange(len(fused)))
+
+def top_fused(ids: np.ndarray, fused: np.ndarray, top: np.ndarray, **metadata: np.ndarray) -> FusedRanking:
+    return FusedRanking(ids[top], fused[top], {key: values[top] for key, values in metadata.items()})
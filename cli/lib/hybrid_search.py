@@ -1,6 +1,12 @@
-import os
+import copy, time
+
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
 from typing import Optional
 
+import numpy as np
+
 from .keyword_search import InvertedIndex
 from .semantic_search import ChunkedSemanticSearch
 from .search_utils import (
@@ -9,125 +15,229 @@ from .search_utils import (
     DEFAULT_ALPHA,
     RRF_K,
     SEARCH_MULTIPLIER,
-    load_movies,
+    HYBRID_LEG_TIMEOUT,
+    DEFAULT_CROSS_ENCODER_BACKEND,
+    CROSS_ENCODER_THREADS,
+    HYBRID_LEG_WORKERS,
+    HYBRID_CANDIDATE_MULTIPLIER,
+    ADAPTIVE_DEPTH_MULTIPLIER,
+    ADAPTIVE_DEPTH_GROWTH,
+    load_test_cases,
     format_search_result,
 )
+from .catalog import open_catalog, document_map
+from .fusion import FusedRanking, weighted_fusion, rrf_fusion
+from .query_cache import MISSING, CachedRanker, open_query_cache, query_cache_mode, normalize_query
+from .search_client import search_server_url, request_search
 from .query_enhancement import enhance_query
 from .reranking import rerank_results
+from .cross_encoder import get_cross_encoder
 from .llm_evaluation import evaluate_rrf_results
+from .stage_timing import timed_stage, in_current_context
+
+LEGS = ("bm25", "semantic")
+EMPTY_LEG = (np.zeros(0, dtype=np.int64), np.zeros(0))
 
 class HybridSearch:
-    def __init__(self, documents):
+    def __init__(self, documents, semantic_search: Optional[ChunkedSemanticSearch] = None, idx: Optional[InvertedIndex] = None, leg_timeout: Optional[float] = HYBRID_LEG_TIMEOUT, adaptive: bool = True, leg_workers: int = HYBRID_LEG_WORKERS, cache_mode: Optional[str] = None):
         self.documents = documents
-        self.semantic_search = ChunkedSemanticSearch()
-        self.semantic_search.load_or_create_chunk_embeddings(self.documents)
+        self.leg_timeout = leg_timeout
+        self.adaptive = adaptive
+        self.cache_mode = query_cache_mode(cache_mode)
+        self.leg_pool = ThreadPoolExecutor(max_workers=leg_workers, thread_name_prefix="hybrid-leg")
+        self.document_map = document_map(documents)
+        self.leg_cache = open_query_cache("hybrid_legs", mode=self.cache_mode)
+        self.result_cache = open_query_cache("hybrid_results", mode=self.cache_mode)
+        if semantic_search is None:
+            semantic_search = ChunkedSemanticSearch(cache_mode=self.cache_mode)
+            semantic_search.load_or_create_chunk_embeddings(self.documents)
+        self.semantic_search = semantic_search
+
+        if idx is None:
+            idx = InvertedIndex()
+            if not idx.exists():
+                idx.build()
+                idx.save()
+            else:
+                idx.load()
+                if not idx.update(self.documents).is_empty:
+                    idx.save()
+        self.idx = idx
+
+    def _bm25_ranker(self, query):
+        key = ("bm25", *self.idx.bm25_params, normalize_query(query))
+        return self._cached_ranker(key, partial(self.idx.bm25_ranker, query))
+
+    def _semantic_ranker(self, query):
+        return self._cached_ranker(self._semantic_key(query), partial(self.semantic_search.chunk_ranker, query))
+
+    def _semantic_key(self, query) -> tuple:
+        return ("semantic", *self._semantic_config(), normalize_query(query))
+
+    def _semantic_config(self) -> tuple:
+        sem = self.semantic_search
+        return (sem.model_name, sem.index_type, sem.n_probe, sem.embedding_dtype, sem.rescore)
+
+    def search_config(self) -> dict:
+        return {
+            "adaptive": self.adaptive,
+            "cache_mode": self.cache_mode,
+            "leg_timeout": self.leg_timeout,
+            "bm25": list(self.idx.bm25_params),
+            "semantic": list(self._semantic_config()),
+        }
 
-        self.idx = InvertedIndex()
-        if not os.path.exists(self.idx.index_path):
-            self.idx.build()
-            self.idx.save()
+    def _cached_ranker(self, key: tuple, make_ranker: Callable) -> Callable:
+        if self.leg_cache is None:
+            return make_ranker()
+        return CachedRanker(self.leg_cache, key, make_ranker)
 
-    def _bm25_search(self, query, limit):
-        self.idx.load()
-        return self.idx.bm25_search(query, limit)
+    def _result_key(self, method: str, query: str, param: float, limit: int) -> tuple:
+        return (method, normalize_query(query), param, limit, self.adaptive, *self.idx.bm25_params, *self._semantic_config())
+
+    def _cached_results(self, key: tuple):
+        if self.result_cache is None:
+            return MISSING
+        results = self.result_cache.get(key)
+        return results if results is MISSING else copy.deepcopy(results)
+
+    def _cached_search(self, key: tuple, search: Callable) -> list[dict]:
+        results = self._cached_results(key)
+        if results is not MISSING:
+            return results
+        ranking, degraded, _ = search()
+        results = self._materialize(ranking, degraded)
+        if self.result_cache is not None and degraded is None:
+            self.result_cache.put(key, copy.deepcopy(results))
+        return results
     
+    def _run_legs(self, legs: dict[str, Callable], deadline: Optional[float]) -> tuple[dict, list[str]]:
+        futures = {name: self.leg_pool.submit(in_current_context(leg)) for name, leg in legs.items()}
+        results, missed = {}, []
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                missed.append(name)
+        if futures and len(missed) == len(futures):
+            raise TimeoutError(f"hybrid search legs missed the {self.leg_timeout}s deadline")
+        return results, missed
+
+    def _initial_depth(self, limit: int, method: str) -> int:
+        # min-max normalization moves with the depth, so only RRF fusion can stop early
+        max_depth = limit * HYBRID_CANDIDATE_MULTIPLIER
+        return min(max_depth, limit * ADAPTIVE_DEPTH_MULTIPLIER) if self.adaptive and method == "rrf" else max_depth
+
+    def _ranked_search(self, query, limit, method: str, fuse: Callable) -> tuple[FusedRanking, Optional[str], int]:
+        deadline = None if self.leg_timeout is None else time.monotonic() + self.leg_timeout
+        depth = self._initial_depth(limit, method)
+        opened, missed = self._run_legs({
+            "bm25": partial(open_leg, self._bm25_ranker, query, depth),
+            "semantic": partial(open_leg, self._semantic_ranker, query, depth),
+        }, deadline)
+        rankers = {name: ranker for name, (ranker, _) in opened.items()}
+        results = {name: result for name, (_, result) in opened.items()}
+        return self._deepen(rankers, results, depth, limit, fuse, deadline, missed[0] if missed else None)
+
+    def _deepen(self, rankers: dict[str, Callable], results: dict[str, tuple], depth: int, limit: int, fuse: Callable, deadline: Optional[float], degraded: Optional[str]) -> tuple[FusedRanking, Optional[str], int]:
+        # Grow the candidate depth until the fused top-k can no longer change, a leg
+        # runs dry or the fixed limit * HYBRID_CANDIDATE_MULTIPLIER depth is reached.
+        max_depth = limit * HYBRID_CANDIDATE_MULTIPLIER
+        ranking, ranked_depth = None, depth
+        while True:
+            pending = [name for name in rankers if name not in results]
+            if pending:
+                if deadline is not None and time.monotonic() >= deadline:
+                    # the deadline cut deepening short, so the shallower ranking is not final
+                    degraded = degraded or pending[0]
+                    break
+                # legs keep their full rankings after the first round, so deeper ranks are slices
+                results.update({name: rankers[name](depth) for name in pending})
+
+            legs = [results.get(name, EMPTY_LEG) for name in LEGS]
+            open_legs = tuple(depth < max_depth and len(ids) == depth for ids, _ in legs)
+            with timed_stage("fusion"):
+                ranking, ranked_depth = fuse(*legs, open_legs, ranking, degraded), depth
+            if ranking.settled or not any(open_legs):
+                break
+            results = {name: leg for name, leg, is_open in zip(LEGS, legs, open_legs) if name in results and not is_open}
+            depth = min(max_depth, depth * ADAPTIVE_DEPTH_GROWTH)
+        return ranking, degraded, ranked_depth
+
+    def _fuse_weighted(self, alpha, limit, bm, sem, open_legs, previous, degraded) -> FusedRanking:
+        match degraded:
+            case "bm25":
+                alpha = 0.0
+            case "semantic":
+                alpha = 1.0
+        return weighted_fusion(*bm, *sem, alpha, limit)
+
+    def _fuse_rrf(self, k, limit, bm, sem, open_legs, previous, degraded) -> FusedRanking:
+        return rrf_fusion(bm[0], sem[0], k, limit, open_legs)
+
+    def _fuser(self, method: str, limit: int, k: float, alpha: float) -> Callable:
+        match method:
+            case "rrf":
+                return partial(self._fuse_rrf, k, limit)
+            case "weighted":
+                return partial(self._fuse_weighted, alpha, limit)
+            case _:
+                raise ValueError(f"unknown hybrid search method: {method}")
+
+    def ranked_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT, method: str = "rrf", k: float = RRF_K, alpha: float = DEFAULT_ALPHA) -> tuple[FusedRanking, Optional[str], int]:
+        return self._ranked_search(query, limit, method, self._fuser(method, limit, k, alpha))
+
     def weighted_search(self, query, alpha, limit=DEFAULT_SEARCH_LIMIT):
-        bm_results = self._bm25_search(query, limit * 500)
-        sem_results = self.semantic_search.search_chunks(query, limit * 500)
-        bm_scores = [d["score"] for d in bm_results]
-        sem_scores = [d["score"] for d in sem_results]
-        norm_bms = normalize_scores(bm_scores)
-        norm_sems = normalize_scores(sem_scores)
-
-        id_to_docs_n_scores = {}
-        for i, bm in enumerate(norm_bms):
-            doc_dict = bm_results[i]
-            doc_id = doc_dict["id"]
-            if not id_to_docs_n_scores.get(doc_id): 
-                id_to_docs_n_scores[doc_id] = {
-                    "title": doc_dict["title"],  
-                    "document": doc_dict["document"],
-                    "bm25_score": 0.0,
-                    "semantic_score": 0.0
-                }
-            if id_to_docs_n_scores[doc_id]["bm25_score"] < bm:
-                id_to_docs_n_scores[doc_id]["bm25_score"] = bm
-            
-        for i, sem in enumerate(norm_sems):
-            doc_dict = sem_results[i]
-            doc_id = doc_dict["id"]
-            if not id_to_docs_n_scores.get(doc_id): 
-                id_to_docs_n_scores[doc_id] = {
-                    "title": doc_dict["title"],  
-                    "document": doc_dict["document"],
-                    "bm25_score": 0.0,
-                    "semantic_score": 0.0
-                }
-            if id_to_docs_n_scores[doc_id]["semantic_score"] < sem:
-                id_to_docs_n_scores[doc_id]["semantic_score"] = sem
-
-        results = []    
-        for k, v in id_to_docs_n_scores.items():
-            hs = hybrid_score(v["bm25_score"], v["semantic_score"], alpha)
-            results.append(format_search_result(
-                doc_id=k,
-                title=v["title"],
-                document=v["document"],
-                score=hs,
-                bm25_score=v["bm25_score"],
-                semantic_score=v["semantic_score"],
-            ))
-        results.sort(key=lambda x: x["score"], reverse=True)
+        fuse = self._fuser("weighted", limit, RRF_K, alpha)
+        return self._cached_search(self._result_key("weighted", query, alpha, limit), partial(self._ranked_search, query, limit, "weighted", fuse))
 
-        return results[:limit]
-    
     def rrf_search(self, query, k=RRF_K, limit=DEFAULT_SEARCH_LIMIT):
-        bm_results = self._bm25_search(query, limit * 500)
-        sem_results = self.semantic_search.search_chunks(query, limit * 500)
-
-        id_to_docs_n_ranks = {}
-        for i, bm in enumerate(bm_results, 1):
-            doc_dict = bm
-            doc_id = doc_dict["id"]
-            if not id_to_docs_n_ranks.get(doc_id): 
-                id_to_docs_n_ranks[doc_id] = {
-                    "title": doc_dict["title"],  
-                    "document": doc_dict["document"],
-                    "rrf_score": 0.0,
-                    "bm25_rank": None,
-                    "semantic_rank": None,
-                }
-            id_to_docs_n_ranks[doc_id]["bm25_rank"] = i
-            id_to_docs_n_ranks[doc_id]["rrf_score"] += rrf_score(i, k)
-
-        for i, sem in enumerate(sem_results, 1):
-            doc_dict = sem
-            doc_id = doc_dict["id"]
-            if not id_to_docs_n_ranks.get(doc_id): 
-                id_to_docs_n_ranks[doc_id] = {
-                    "title": doc_dict["title"],  
-                    "document": doc_dict["document"],
-                    "rrf_score": 0.0,
-                    "bm25_rank": None,
-                    "semantic_rank": None,
-                }
-            id_to_docs_n_ranks[doc_id]["semantic_rank"] = i
-            id_to_docs_n_ranks[doc_id]["rrf_score"] += rrf_score(i, k)
-
-        results = []    
-        for k, v in id_to_docs_n_ranks.items():
+        fuse = self._fuser("rrf", limit, k, DEFAULT_ALPHA)
+        return self._cached_search(self._result_key("rrf", query, k, limit), partial(self._ranked_search, query, limit, "rrf", fuse))
+
+    def search_many(self, queries: list[str], method: str = "rrf", limit: int = DEFAULT_SEARCH_LIMIT, k: float = RRF_K, alpha: float = DEFAULT_ALPHA) -> list[list[dict]]:
+        fuse = self._fuser(method, limit, k, alpha)
+        keys = [self._result_key(method, query, k if method == "rrf" else alpha, limit) for query in queries]
+        results = [self._cached_results(key) for key in keys]
+        misses = [i for i, r in enumerate(results) if r is MISSING]
+        if not misses:
+            return results
+
+        pending = [queries[i] for i in misses]
+        rankers, _ = self._run_legs({
+            "bm25": lambda: [self._bm25_ranker(query) for query in pending],
+            "semantic": lambda: self.semantic_search.chunk_rankers(pending),
+        }, None)
+        depth = self._initial_depth(limit, method)
+        for i, query, bm, sem in zip(misses, pending, rankers["bm25"], rankers["semantic"]):
+            sem = self._cached_ranker(self._semantic_key(query), lambda sem=sem: sem)
+            ranking, degraded, _ = self._deepen({"bm25": bm, "semantic": sem}, {}, depth, limit, fuse, None, None)
+            results[i] = self._materialize(ranking, degraded)
+            if self.result_cache is not None and degraded is None:
+                self.result_cache.put(keys[i], copy.deepcopy(results[i]))
+        return results
+
+    def _materialize(self, ranking: FusedRanking, degraded: Optional[str] = None) -> list[dict]:
+        results = []
+        for i, (doc_id, score) in enumerate(zip(ranking.ids.tolist(), ranking.scores.tolist())):
+            doc = self.document_map[doc_id]
+            metadata = ranking.metadata_at(i)
+            if degraded:
+                metadata["missed_leg"] = degraded
             results.append(format_search_result(
-                doc_id=k,
-                title=v["title"],
-                document=v["document"],
-                score=v["rrf_score"],
-                bm25_rank=v["bm25_rank"],
-                semantic_rank=v["semantic_rank"],
+                doc_id=doc_id,
+                title=doc["title"],
+                document=doc["description"],
+                score=score,
+                **metadata,
             ))
-        results.sort(key=lambda x: x["score"], reverse=True)
-
-        return results[:limit]
+        return results
     
+def open_leg(make_ranker: Callable, query: str, depth: int) -> tuple[Callable, tuple]:
+    ranker = make_ranker(query)
+    return ranker, ranker(depth)
+
 def normalize_scores(scores: list) -> list:
     if not scores:
         return []
@@ -150,9 +260,13 @@ def hybrid_score(bm25_score: float, semantic_score: float, alpha: float = DEFAUL
     return alpha * bm25_score + (1 - alpha) * semantic_score
 
 def weighted_search(query: str, alpha: float = DEFAULT_ALPHA, limit: int = DEFAULT_SEARCH_LIMIT) -> None:
-    movies = load_movies()
-    hs = HybridSearch(movies)
-    results = hs.weighted_search(query, alpha, limit)
+    if search_server_url():
+        results = request_search("weighted_search", {"query": query, "alpha": alpha, "limit": limit})
+    else:
+        movies = open_catalog()
+        hs = HybridSearch(movies)
+        results = hs.weighted_search(query, alpha, limit)
+    print_missed_leg(results)
     print(f"Weighted Hybrid Search Results for '{query}' (alpha={alpha})")
     print(f"Alpha {alpha}: {int(alpha * 100)}% Keyword, {int((1 - alpha) * 100)}% Semantic")
     print("Results:")
@@ -162,10 +276,17 @@ def weighted_search(query: str, alpha: float = DEFAULT_ALPHA, limit: int = DEFAU
         print(f"   BM25: {res['metadata']['bm25_score']:.3f}, Semantic: {res['metadata']['semantic_score']:.3f}")
         print(f"   {res['document'][:DOCUMENT_PREVIEW_LENGTH]}...")
 
+def print_missed_leg(results: list[dict]) -> None:
+    if results and results[0]["metadata"].get("missed_leg"):
+        print(f"Warning: {results[0]['metadata']['missed_leg']} search timed out, showing single-leg results")
+
+def print_rerank_progress(res: dict) -> None:
+    print(f"   scored {res['title']}: {res['metadata']['individual_score']:.1f}/10")
+
 def rrf_score(rank, k=RRF_K):
     return 1 / (k + rank)
 
-def rrf_search(query: str, k: int = RRF_K, enhance: Optional[str] = None, rerank_method: Optional[str] = None, evaluate: Optional[bool] = False, limit: int = DEFAULT_SEARCH_LIMIT) -> None:
+def rrf_search(query: str, k: int = RRF_K, enhance: Optional[str] = None, rerank_method: Optional[str] = None, evaluate: Optional[bool] = False, limit: int = DEFAULT_SEARCH_LIMIT, cross_encoder_backend: str = DEFAULT_CROSS_ENCODER_BACKEND, cross_encoder_threads: int = CROSS_ENCODER_THREADS) -> None:
     print(f"Original query: {query}")
     if enhance:
         enhanced_query = enhance_query(query, enhance)
@@ -174,15 +295,20 @@ def rrf_search(query: str, k: int = RRF_K, enhance: Optional[str] = None, rerank
 
     search_limit = limit * SEARCH_MULTIPLIER if rerank_method else limit
 
-    movies = load_movies()
-    hs = HybridSearch(movies)
-    results = hs.rrf_search(query, k, search_limit)
+    if search_server_url():
+        results = request_search("rrf_search", {"query": query, "k": k, "limit": search_limit})
+    else:
+        movies = open_catalog()
+        hs = HybridSearch(movies)
+        results = hs.rrf_search(query, k, search_limit)
 
+    print_missed_leg(results)
     print(f"RRF results: {[r['title'] for r in results]}")
 
     if rerank_method:
         print(f"Reranking top {len(results)} results using {rerank_method} method...\n")
-        results = rerank_results(query, results, rerank_method, limit)
+        cross_encoder = get_cross_encoder(cross_encoder_backend, cross_encoder_threads) if rerank_method == "cross_encoder" else None
+        results = rerank_results(query, results, rerank_method, limit, on_result=print_rerank_progress, cross_encoder=cross_encoder)
 
     print(f"RRF Hybrid Search Results for '{query}' (k={k})")
     print("Results:")
@@ -213,4 +339,33 @@ def rrf_search(query: str, k: int = RRF_K, enhance: Optional[str] = None, rerank
         print("\nLLM Evaluation (0-3 relevance scale):")
         report = evaluate_rrf_results(query, results)
         for i, r in enumerate(report, 1):
-            print(f"{i}. {r['title']}: {r['eval']}/3")
\ No newline at end of file
+            print(f"{i}. {r['title']}: {r['eval']}/3")
+
+def adaptive_depth_command(limit: int = DEFAULT_SEARCH_LIMIT, k: float = RRF_K) -> None:
+    movies = open_catalog()
+    # query caches would hand whichever mode runs second its legs for free
+    hs = HybridSearch(movies, leg_timeout=None, cache_mode="off")
+    test_cases = load_test_cases()
+    for c in test_cases:
+        hs.ranked_search(c["query"], limit, "rrf", k)
+
+    matches, overlaps, depths, times = 0, [], [], {True: 0.0, False: 0.0}
+    for c in test_cases:
+        rankings = {}
+        for adaptive in (True, False):
+            hs.adaptive = adaptive
+            start = time.perf_counter()
+            rankings[adaptive], _, depth = hs.ranked_search(c["query"], limit, "rrf", k)
+            times[adaptive] += time.perf_counter() - start
+            if adaptive:
+                depths.append(depth)
+        adaptive_ids, fixed_ids = rankings[True].ids.tolist(), rankings[False].ids.tolist()
+        matches += adaptive_ids == fixed_ids
+        overlaps.append(len(set(adaptive_ids) & set(fixed_ids)) / len(fixed_ids) if fixed_ids else 1.0)
+        print(f"- {c['query']}: depth {depths[-1]}, {'identical' if adaptive_ids == fixed_ids else 'differs'}")
+
+    n = max(1, len(test_cases))
+    print(f"\nRRF adaptive vs fixed depth {limit * HYBRID_CANDIDATE_MULTIPLIER} over {len(test_cases)} golden queries")
+    print(f"Identical top-{limit}: {matches}/{len(test_cases)}, mean overlap {sum(overlaps) / n:.3f}")
+    print(f"Mean depth: {sum(depths) / n:.1f}, max depth: {max(depths, default=0)}")
+    print(f"adaptive: {times[True] * 1000 / n:.2f} ms/query, fixed: {times[False] * 1000 / n:.2f} ms/query")
@@ -1,65 +1,154 @@
-import string, os, math
+import os, math, json, time
 
-from collections import Counter, defaultdict
+import numpy as np
 
-from nltk.stem import PorterStemmer
-from pickle import dump, load
+from collections import Counter
+from collections.abc import Callable, Sequence
+from functools import partial
 
 from .search_utils import (
     DEFAULT_SEARCH_LIMIT,
     CACHE_DIR,
     BM25_K1,
     BM25_B,
-    load_stopwords,
-    load_movies,
+    DEFAULT_INDEX_WORKERS,
+    MIN_SHARD_SIZE,
     format_search_result,
+    save_array,
+)
+from .text_analyzer import TextAnalyzer, default_analyzer
+from .build_pipeline import BuildStats
+from .vector_utils import PrefixRanker, top_k_indices
+from .query_cache import bump_index_version
+from .stage_timing import timed_stage
+from .search_client import search_server_url, request_search
+from .catalog import (
+    CatalogDiff,
+    RecordStore,
+    catalog_hashes,
+    diff_catalog,
+    document_map,
+    open_catalog,
+    write_record_store,
 )
 
-INDEX_PATH = os.path.join(CACHE_DIR, "index.pkl")
-DOCMAP_PATH = os.path.join(CACHE_DIR, "docmap.pkl")
-TF_PATH = os.path.join(CACHE_DIR, "term_frequencies.pkl")
-DOCLENGTHS_PATH = os.path.join(CACHE_DIR, "doc_lengths.pkl")
+INDEX_DIR = os.path.join(CACHE_DIR, "inverted_index")
+INDEX_PATH = os.path.join(INDEX_DIR, "meta.json")
+TERMS_PATH = os.path.join(INDEX_DIR, "terms.npy")
+POSTINGS_OFFSETS_PATH = os.path.join(INDEX_DIR, "postings_offsets.npy")
+POSTINGS_DELTAS_PATH = os.path.join(INDEX_DIR, "postings_deltas.npy")
+POSTINGS_TFS_PATH = os.path.join(INDEX_DIR, "postings_tfs.npy")
+POSTINGS_IMPACTS_PATH = os.path.join(INDEX_DIR, "postings_impacts.npy")
+TERM_IDF_PATH = os.path.join(INDEX_DIR, "term_idf.npy")
+TERM_MAX_IMPACTS_PATH = os.path.join(INDEX_DIR, "term_max_impacts.npy")
+DOC_IDS_PATH = os.path.join(INDEX_DIR, "doc_ids.npy")
+DOC_LENGTHS_PATH = os.path.join(INDEX_DIR, "doc_lengths.npy")
+DOCUMENTS_DIR = os.path.join(INDEX_DIR, "documents")
 
 class InvertedIndex:
     def __init__(self) -> None:
-        self.index = {}
         self.docmap = {}
-        self.term_frequencies = defaultdict(Counter)
-        self.doc_lengths = {}
+        self.terms = np.array([], dtype="S1")
+        self.postings_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_deltas = np.array([], dtype=np.int32)
+        self.postings_tfs = np.array([], dtype=np.int32)
+        self.postings_impacts = np.array([], dtype=np.float32)
+        self.term_idf = np.array([], dtype=np.float64)
+        self.term_max_impacts = np.array([], dtype=np.float32)
+        self.doc_ids = np.array([], dtype=np.int64)
+        self.doc_lengths = np.array([], dtype=np.int32)
         self.index_path = INDEX_PATH
+        self.avg_doc_length = 0.0
+        self.bm25_params = (BM25_K1, BM25_B)
+        self.doc_hashes = {}
+
+    def __add_documents(self, items: list[dict], workers: int = DEFAULT_INDEX_WORKERS) -> dict:
+        return merge_postings(default_analyzer().map_shards(shard_postings, items, workers, MIN_SHARD_SIZE))
+
+    def __freeze(self, vocabulary: np.ndarray, vocab_ids: np.ndarray, posting_doc_ids: np.ndarray, tfs: np.ndarray, doc_ids: np.ndarray, doc_lengths: np.ndarray) -> None:
+        doc_order = np.argsort(doc_ids, kind="stable")
+        self.doc_ids = doc_ids[doc_order].astype(np.int64)
+        self.doc_lengths = doc_lengths[doc_order].astype(np.int32)
+
+        terms, vocab_rows = np.unique(vocabulary, return_inverse=True)
+        rows = vocab_rows[vocab_ids]
+        used = np.bincount(rows, minlength=len(terms)) > 0
+        terms, rows = terms[used], (np.cumsum(used) - 1)[rows]
+
+        positions = np.searchsorted(self.doc_ids, posting_doc_ids)
+        order = np.lexsort((positions, rows))
+        rows, positions = rows[order], positions[order].astype(np.int32)
+        counts = np.bincount(rows, minlength=len(terms))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
 
-    def __add_document(self, doc_id: int, text: str) -> None:
-        tokens = tokenize_and_preprocess_text(text)
-        for token in tokens:
-            if self.index.get(token) == None:
-                self.index[token] = set()
-            self.index[token].add(doc_id)
-        self.term_frequencies[doc_id].update(tokens)
-        self.doc_lengths[doc_id] = len(tokens)
+        deltas = positions.copy()
+        deltas[1:] -= positions[:-1]
+        starts = offsets[:-1][counts > 0]
+        deltas[starts] = positions[starts]
+
+        self.terms = terms if len(terms) > 0 else np.array([], dtype="S1")
+        self.postings_offsets = offsets
+        self.postings_deltas = deltas
+        self.postings_tfs = tfs[order].astype(np.int32)
 
     def __get_avg_doc_length(self) -> float:
-        if not self.doc_lengths or len(self.doc_lengths) == 0:
+        if len(self.doc_lengths) == 0:
             return 0.0
-        sum = 0
-        for value in self.doc_lengths.values():
-            sum += value
-        return sum / len(self.doc_lengths)
+        return float(self.doc_lengths.mean())
+
+    def _term_row(self, term: str) -> int | None:
+        key = term.encode()
+        row = int(np.searchsorted(self.terms, key))
+        if row < len(self.terms) and self.terms[row] == key:
+            return row
+        return None
+
+    def _doc_position(self, doc_id: int) -> int | None:
+        pos = int(np.searchsorted(self.doc_ids, doc_id))
+        if pos < len(self.doc_ids) and self.doc_ids[pos] == doc_id:
+            return pos
+        return None
+
+    def _postings_range(self, term: str) -> tuple[int, int]:
+        row = self._term_row(term)
+        if row is None:
+            return 0, 0
+        return int(self.postings_offsets[row]), int(self.postings_offsets[row + 1])
+
+    def _decode_positions(self, start: int, end: int) -> np.ndarray:
+        return np.cumsum(self.postings_deltas[start:end], dtype=np.int64)
+
+    def _decode_all_positions(self) -> np.ndarray:
+        lengths = np.diff(self.postings_offsets)
+        cumulative = np.cumsum(self.postings_deltas, dtype=np.int64)
+        starts = self.postings_offsets[:-1][lengths > 0]
+        base = cumulative[starts] - self.postings_deltas[starts]
+        return cumulative - np.repeat(base, lengths[lengths > 0])
 
     def get_documents(self, term: str) -> list[int]:
-        docs = self.index.get(term, set())
-        return sorted(list(docs))
+        start, end = self._postings_range(term)
+        return self.doc_ids[self._decode_positions(start, end)].tolist()
 
     def get_tf(self, doc_id: int, term: str) -> int:
         tokens = tokenize_and_preprocess_text(term)
         if len(tokens) != 1:
             raise ValueError("term should present only one word")
-        return self.term_frequencies[doc_id][tokens[0]]
+        doc_pos = self._doc_position(doc_id)
+        if doc_pos is None:
+            return 0
+        start, end = self._postings_range(tokens[0])
+        positions = self._decode_positions(start, end)
+        i = int(np.searchsorted(positions, doc_pos))
+        if i < len(positions) and positions[i] == doc_pos:
+            return int(self.postings_tfs[start + i])
+        return 0
     
     def get_idf(self, term: str) -> float:
         tokens = tokenize_and_preprocess_text(term)
         if len(tokens) != 1:
             raise ValueError("term should present only one word")
-        return math.log((len(self.docmap ) + 1) / (len(self.get_documents(tokens[0])) + 1))
+        start, end = self._postings_range(tokens[0])
+        return math.log((len(self.doc_ids) + 1) / (end - start + 1))
     
     def get_tf_idf(self, doc_id: int, term: str) -> float:
         return self.get_tf(doc_id, term) * self.get_idf(term)
@@ -68,92 +157,239 @@ class InvertedIndex:
         tokens = tokenize_and_preprocess_text(term)
         if len(tokens) != 1:
             raise ValueError("term should present only one word")
-        freq = len(self.get_documents(tokens[0]))
-        return math.log((len(self.docmap ) - freq + 0.5) / (freq + 0.5) + 1)
+        start, end = self._postings_range(tokens[0])
+        freq = end - start
+        return math.log((len(self.doc_ids) - freq + 0.5) / (freq + 0.5) + 1)
     
     def get_bm25_tf(self, doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25_B) -> float:
         raw_tf = self.get_tf(doc_id, term)
-        doc_length = self.doc_lengths.get(doc_id, 0)
-        avg_doc_length = self.__get_avg_doc_length()
-        if avg_doc_length > 0:
-            norm = 1 - b + b * (doc_length / avg_doc_length)
-        else:
-            norm = 1
-        return (raw_tf * (k1 + 1)) / (raw_tf + k1 * norm)
+        doc_pos = self._doc_position(doc_id)
+        doc_length = int(self.doc_lengths[doc_pos]) if doc_pos is not None else 0
+        return bm25_saturated_tf(raw_tf, doc_length, self.avg_doc_length, k1, b)
     
     def bm25(self, doc_id: int, term: str) -> float:
         return self.get_bm25_tf(doc_id, term) * self.get_bm25_idf(term)
+
+    def build_bm25_postings(self, k1: float = BM25_K1, b: float = BM25_B) -> None:
+        self.avg_doc_length = self.__get_avg_doc_length()
+        total_docs = len(self.doc_ids)
+        freqs = np.diff(self.postings_offsets)
+        self.term_idf = np.log((total_docs - freqs + 0.5) / (freqs + 0.5) + 1)
+
+        positions = self._decode_all_positions()
+        tfs = self.postings_tfs.astype(np.float64)
+        doc_lengths = self.doc_lengths[positions]
+        saturated = bm25_saturated_tf(tfs, doc_lengths, self.avg_doc_length, k1, b)
+        self.postings_impacts = (saturated * np.repeat(self.term_idf, freqs)).astype(np.float32)
+
+        self.term_max_impacts = np.zeros(len(freqs), dtype=np.float32)
+        if len(self.postings_impacts) > 0:
+            starts = self.postings_offsets[:-1][freqs > 0]
+            self.term_max_impacts[freqs > 0] = np.maximum.reduceat(self.postings_impacts, starts)
+        self.bm25_params = (k1, b)
+
+    def _bm25_top_k(self, query_tokens: list[str], limit: int) -> tuple[np.ndarray, np.ndarray]:
+        # MaxScore, term-at-a-time: terms are visited by decreasing upper bound and,
+        # once the bounds of the terms left cannot lift an unseen document past the
+        # current k-th score, the rest only update (and prune) existing candidates.
+        if limit <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        query_terms = []
+        for token, count in Counter(query_tokens).items():
+            row = self._term_row(token)
+            if row is not None:
+                query_terms.append((count * float(self.term_max_impacts[row]), row, count))
+        query_terms.sort(reverse=True)
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        matched = np.zeros(len(self.doc_ids), dtype=bool)
+        remaining = sum(upper_bound for upper_bound, _, _ in query_terms)
+        admitting = True
+        for upper_bound, row, count in query_terms:
+            remaining -= upper_bound
+            start, end = int(self.postings_offsets[row]), int(self.postings_offsets[row + 1])
+            positions = self._decode_positions(start, end)
+            impacts = count * self.postings_impacts[start:end].astype(np.float64)
+            if not admitting:
+                known = matched[positions]
+                positions, impacts = positions[known], impacts[known]
+            scores[positions] += impacts
+            matched[positions] = True
+
+            candidates = np.flatnonzero(matched)
+            if len(candidates) < limit:
+                continue
+            threshold = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            if remaining < threshold:
+                admitting = False
+                matched[candidates[scores[candidates] + remaining < threshold]] = False
+
+        candidates = np.flatnonzero(matched)
+        ranked = candidates[top_k_indices(scores[candidates], limit, self.doc_ids[candidates])]
+        return ranked, scores[ranked]
     
-    def bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        query_tokens = tokenize_and_preprocess_text(query)
+    def bm25_top_k(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT, k1: float = BM25_K1, b: float = BM25_B) -> tuple[np.ndarray, np.ndarray]:
+        return self._ranked_ids(partial(self._bm25_top_k, self._query_tokens(query, k1, b)), limit)
+
+    def bm25_ranker(self, query: str, k1: float = BM25_K1, b: float = BM25_B) -> Callable[[int], tuple[np.ndarray, np.ndarray]]:
+        # rankers are asked for growing depths, so score every match once and slice it
+        ranker = PrefixRanker(partial(self._bm25_top_k, self._query_tokens(query, k1, b)), len(self.doc_ids), eager=True)
+        return partial(self._ranked_ids, ranker)
 
-        candidates = set()
-        for token in query_tokens:
-            candidates |= self.index.get(token, set())
+    def _query_tokens(self, query: str, k1: float, b: float) -> list[str]:
+        if self.bm25_params != (k1, b):
+            self.build_bm25_postings(k1, b)
+        with timed_stage("tokenize"):
+            return tokenize_and_preprocess_text(query)
 
-        scores = {}
-        for doc_id in candidates:
-            score = 0.0
-            for token in query_tokens:
-                score += self.bm25(doc_id, token)
-            scores[doc_id] = score
+    def _ranked_ids(self, ranker: Callable[[int], tuple[np.ndarray, np.ndarray]], limit: int) -> tuple[np.ndarray, np.ndarray]:
+        with timed_stage("bm25"):
+            ranked_docs, scores = ranker(limit)
+        return np.asarray(self.doc_ids[ranked_docs], dtype=np.int64), scores
 
-        ranked_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    def bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT, k1: float = BM25_K1, b: float = BM25_B) -> list[dict]:
+        doc_ids, scores = self.bm25_top_k(query, limit, k1, b)
 
         results = []
-        for doc_id, score in ranked_docs[:limit]:
+        for doc_id, score in zip(doc_ids.tolist(), scores):
             doc = self.docmap[doc_id]
             f_result = format_search_result(
                 doc_id=doc_id,
                 title=doc["title"],
                 document=doc["description"],
-                score=score,
+                score=float(score),
             )
             results.append(f_result)
         return results
 
-    def build(self) -> None:
-        items = load_movies()
-        for item in items:
-            item_id = int(item["id"])
-            self.docmap[item_id] = item
-            self.__add_document(item_id, f"{item["title"]} {item["description"]}")
+    def search_many(self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT, k1: float = BM25_K1, b: float = BM25_B) -> list[list[dict]]:
+        return [self.bm25_search(query, limit, k1, b) for query in queries]
+
+    def build(self, workers: int = DEFAULT_INDEX_WORKERS) -> BuildStats:
+        start = time.perf_counter()
+        items = open_catalog()
+        self.docmap = document_map(items)
+        self.__freeze(**self.__add_documents(items, workers))
+        self.build_bm25_postings()
+        self.doc_hashes = catalog_hashes(items)
+        return BuildStats(len(items), len(self.postings_tfs), time.perf_counter() - start)
+
+    def update(self, documents: list[dict]) -> CatalogDiff:
+        diff = diff_catalog(documents, self.doc_hashes)
+        if diff.is_empty:
+            return diff
+
+        stale = np.array(sorted(diff.stale), dtype=np.int64)
+        positions = self._decode_all_positions()
+        rows = np.repeat(np.arange(len(self.terms)), np.diff(self.postings_offsets))
+        kept_postings = ~np.isin(self.doc_ids[positions], stale)
+        kept_docs = ~np.isin(self.doc_ids, stale)
+
+        self.docmap = document_map(documents)
+        fresh = self.__add_documents([self.docmap[doc_id] for doc_id in diff.fresh])
+        self.__freeze(
+            vocabulary=np.concatenate([np.asarray(self.terms), fresh["vocabulary"]]),
+            vocab_ids=np.concatenate([rows[kept_postings], fresh["vocab_ids"] + len(self.terms)]),
+            posting_doc_ids=np.concatenate([self.doc_ids[positions[kept_postings]], fresh["posting_doc_ids"]]),
+            tfs=np.concatenate([self.postings_tfs[kept_postings], fresh["tfs"]]),
+            doc_ids=np.concatenate([self.doc_ids[kept_docs], fresh["doc_ids"]]),
+            doc_lengths=np.concatenate([self.doc_lengths[kept_docs], fresh["doc_lengths"]]),
+        )
+        self.build_bm25_postings(*self.bm25_params)
+        self.doc_hashes = catalog_hashes(documents)
+        return diff
 
     def save(self) -> None:
-        os.makedirs(CACHE_DIR, exist_ok=True)
-        with open(self.index_path, "wb") as f:
-            dump(self.index, f)
-        with open(DOCMAP_PATH, "wb") as f:
-            dump(self.docmap, f)
-        with open(TF_PATH, "wb") as f:
-            dump(self.term_frequencies, f)
-        with open(DOCLENGTHS_PATH, "wb") as f:
-            dump(self.doc_lengths, f)
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        save_array(TERMS_PATH, self.terms)
+        save_array(POSTINGS_OFFSETS_PATH, self.postings_offsets)
+        save_array(POSTINGS_DELTAS_PATH, self.postings_deltas)
+        save_array(POSTINGS_TFS_PATH, self.postings_tfs)
+        save_array(POSTINGS_IMPACTS_PATH, self.postings_impacts)
+        save_array(TERM_IDF_PATH, self.term_idf)
+        save_array(TERM_MAX_IMPACTS_PATH, self.term_max_impacts)
+        save_array(DOC_IDS_PATH, self.doc_ids)
+        save_array(DOC_LENGTHS_PATH, self.doc_lengths)
+        write_record_store(DOCUMENTS_DIR, (self.docmap[int(doc_id)] for doc_id in self.doc_ids))
+        with open(self.index_path, "w") as f:
+            json.dump({
+                "k1": self.bm25_params[0],
+                "b": self.bm25_params[1],
+                "avg_doc_length": self.avg_doc_length,
+                "total_docs": len(self.doc_ids),
+                "total_terms": len(self.terms),
+            }, f, indent=2)
+        bump_index_version("bm25_index")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path) and os.path.exists(DOCUMENTS_DIR)
 
     def load(self) -> None:
-        with open(self.index_path, "rb") as f:
-            self.index = load(f)
-        with open(DOCMAP_PATH, "rb") as f:
-            self.docmap = load(f)
-        with open(TF_PATH, "rb") as f:
-            self.term_frequencies = load(f)
-        with open(DOCLENGTHS_PATH, "rb") as f:
-            self.doc_lengths = load(f)
-
-def fully_matches_to_any(token: str, words: list[str]) -> bool:
-    for word in words:
-        if token == word:
-            return True
-    return False
+        with open(self.index_path, "r") as f:
+            meta = json.load(f)
+        self.terms = np.load(TERMS_PATH, mmap_mode="r")
+        self.postings_offsets = np.load(POSTINGS_OFFSETS_PATH, mmap_mode="r")
+        self.postings_deltas = np.load(POSTINGS_DELTAS_PATH, mmap_mode="r")
+        self.postings_tfs = np.load(POSTINGS_TFS_PATH, mmap_mode="r")
+        self.postings_impacts = np.load(POSTINGS_IMPACTS_PATH, mmap_mode="r")
+        self.term_idf = np.load(TERM_IDF_PATH, mmap_mode="r")
+        self.term_max_impacts = np.load(TERM_MAX_IMPACTS_PATH, mmap_mode="r")
+        self.doc_ids = np.load(DOC_IDS_PATH, mmap_mode="r")
+        self.doc_lengths = np.load(DOC_LENGTHS_PATH, mmap_mode="r")
+        self.bm25_params = (meta["k1"], meta["b"])
+        self.avg_doc_length = meta["avg_doc_length"]
+        documents = RecordStore(DOCUMENTS_DIR)
+        self.docmap = documents.by_id
+        self.doc_hashes = documents.hashes()
+
+def encode_terms(terms: list[str]) -> np.ndarray:
+    if not terms:
+        return np.array([], dtype="S1")
+    return np.array([term.encode() for term in terms], dtype=bytes)
+
+def bm25_saturated_tf(raw_tf: int, doc_length: int, avg_doc_length: float, k1: float = BM25_K1, b: float = BM25_B) -> float:
+    if avg_doc_length > 0:
+        norm = 1 - b + b * (doc_length / avg_doc_length)
+    else:
+        norm = 1
+    return (raw_tf * (k1 + 1)) / (raw_tf + k1 * norm)
+
+def shard_postings(analyzer: TextAnalyzer, items: Sequence[dict]) -> dict:
+    vocabulary = {}
+    postings = {"vocab_ids": [], "doc_ids": [], "tfs": []}
+    doc_ids, doc_lengths = [], []
+    for item in items:
+        item_id = int(item["id"])
+        tokens = analyzer.analyze(f"{item["title"]} {item["description"]}")
+        for token, tf in Counter(tokens).items():
+            postings["vocab_ids"].append(vocabulary.setdefault(token, len(vocabulary)))
+            postings["doc_ids"].append(item_id)
+            postings["tfs"].append(tf)
+        doc_ids.append(item_id)
+        doc_lengths.append(len(tokens))
+    return {
+        "vocabulary": encode_terms(list(vocabulary)),
+        "vocab_ids": np.array(postings["vocab_ids"], dtype=np.int64),
+        "posting_doc_ids": np.array(postings["doc_ids"], dtype=np.int64),
+        "tfs": np.array(postings["tfs"], dtype=np.int32),
+        "doc_ids": np.array(doc_ids, dtype=np.int64),
+        "doc_lengths": np.array(doc_lengths, dtype=np.int32),
+    }
+
+def merge_postings(shards: list[dict]) -> dict:
+    vocab_offsets = np.cumsum([0] + [len(shard["vocabulary"]) for shard in shards[:-1]])
+    return {
+        "vocabulary": np.concatenate([shard["vocabulary"] for shard in shards]),
+        "vocab_ids": np.concatenate([shard["vocab_ids"] + offset for shard, offset in zip(shards, vocab_offsets)]),
+        "posting_doc_ids": np.concatenate([shard["posting_doc_ids"] for shard in shards]),
+        "tfs": np.concatenate([shard["tfs"] for shard in shards]),
+        "doc_ids": np.concatenate([shard["doc_ids"] for shard in shards]),
+        "doc_lengths": np.concatenate([shard["doc_lengths"] for shard in shards]),
+    }
 
 def tokenize_and_preprocess_text(text: str) -> list[str]:
-    text = text.lower()
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    tokens = list(filter(lambda x: x != "", text.split()))
-    stopwords = load_stopwords()
-    tokens = list(filter(lambda x: not fully_matches_to_any(x, stopwords), tokens))
-    stemmer = PorterStemmer()
-    return list(map(stemmer.stem, tokens))
+    return default_analyzer().analyze(text)
 
 def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
     idx = InvertedIndex()
@@ -175,10 +411,23 @@ def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
                 return results
     return results
 
-def build_command() -> None:
+def build_command(workers: int = DEFAULT_INDEX_WORKERS) -> BuildStats:
     idx = InvertedIndex()
-    idx.build()
+    stats = idx.build(workers)
     idx.save()
+    return stats
+
+def update_command() -> CatalogDiff:
+    idx = InvertedIndex()
+    if not idx.exists():
+        idx.build()
+        idx.save()
+        return CatalogDiff(added=[int(doc_id) for doc_id in idx.doc_ids])
+    idx.load()
+    diff = idx.update(open_catalog())
+    if not diff.is_empty:
+        idx.save()
+    return diff
 
 def tf_command(doc_id: int, term: str) -> int:
     idx = InvertedIndex()
@@ -206,6 +455,8 @@ def bm25_tf_command(doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25
     return idx.get_bm25_tf(doc_id, term, k1, b)
 
 def bm25search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+    if search_server_url():
+        return request_search("bm25search", {"query": query, "limit": limit})
     idx = InvertedIndex()
     idx.load()
     return idx.bm25_search(query, limit)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os, json, time, asyncio, sqlite3, hashlib, threading
+
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+
+from .search_utils import (
+    LLM_CACHE_ENV,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+)
+
+class LLMResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float | None = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._writes = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._writes += 1
+            if self._writes % 64 == 0:
+                self._evict(now)
+
+    def get_or_compute(self, key: str, model: str, compute: Callable[[], str]) -> str:
+        response = self.get(key)
+        if response is not None:
+            return response
+
+        flight, leader = self._join_flight(key)
+        if not leader:
+            return flight.result()
+
+        try:
+            # a previous leader may have stored the response since the miss above
+            response = self.get(key)
+            if response is None:
+                response = compute()
+                self.put(key, model, response)
+            flight.set_result(response)
+            return response
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def get_or_compute_async(self, key: str, model: str, compute: Callable[[], Awaitable[str]]) -> str:
+        response = self.get(key)
+        if response is not None:
+            return response
+
+        flight, leader = self._join_flight(key)
+        if not leader:
+            return await asyncio.wrap_future(flight)
+
+        try:
+            # a previous leader may have stored the response since the miss above
+            response = self.get(key)
+            if response is None:
+                response = await compute()
+                self.put(key, model, response)
+            flight.set_result(response)
+            return response
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _join_flight(self, key: str) -> tuple[Future, bool]:
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._in_flight[key] = Future()
+            return flight, True
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.conn.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+def response_key(model: str, messages: list[dict], params: dict) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def open_llm_cache() -> LLMResponseCache | None:
+    if os.environ.get(LLM_CACHE_ENV, "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    return LLMResponseCache()
@@ -1,19 +1,169 @@
-import os
+import os, time, queue, random, asyncio, threading
+
+from collections.abc import Iterator
+from functools import lru_cache
 from dotenv import load_dotenv
-from groq import Groq
+from groq import Groq, AsyncGroq, RateLimitError
+
+from .llm_cache import LLMResponseCache, open_llm_cache, response_key
+from .search_utils import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_RATE_BURST,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+)
 
 load_dotenv()
 api_key = os.environ.get("GROQ_API_KEY")
 cli = Groq(api_key=api_key)
 model = "groq/compound"
 
-def perform_groq_request(prompt: str) -> str:
+class TokenBucket:
+    def __init__(self, rate: float = LLM_REQUESTS_PER_MINUTE / 60, capacity: float = LLM_RATE_BURST) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        # reserve under a thread lock so one bucket can pace callers on any event loop
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate) - 1
+            self.updated = now
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class TokenStream:
+    def __init__(self, prompt: str, **params) -> None:
+        self.messages = [{"role": "user", "content": prompt}]
+        self.params = params
+        self.text = ""
+        self.tokens = 0
+        self.cached = False
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self._chunks = queue.Queue()
+        self._worker = threading.Thread(target=self._produce, daemon=True)
+        self._worker.start()
+
+    def __iter__(self) -> Iterator[str]:
+        while (item := self._chunks.get()) is not None:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    @property
+    def time_to_first_token(self) -> float | None:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        if self.cached or self.first_token_at is None or self.finished_at is None or self.finished_at <= self.first_token_at:
+            return None
+        return self.tokens / (self.finished_at - self.first_token_at)
+
+    def _emit(self, token: str) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self._chunks.put(token)
+
+    def _produce(self) -> None:
+        try:
+            key = response_key(model, self.messages, self.params)
+            response_cache = llm_response_cache()
+            if response_cache is not None and (cached := response_cache.get(key)) is not None:
+                self.cached = True
+                self.text = cached
+                self.tokens = len(cached.split())
+                self._emit(cached)
+            else:
+                self._stream(key)
+            self.finished_at = time.perf_counter()
+            self._chunks.put(None)
+        except BaseException as e:
+            self._chunks.put(e)
+
+    def _stream(self, key: str) -> None:
+        parts, usage_tokens = [], None
+        for chunk in cli.chat.completions.create(model=model, messages=self.messages, stream=True, **self.params):
+            usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None and getattr(usage, "completion_tokens", None):
+                usage_tokens = usage.completion_tokens
+            if not chunk.choices or not (token := chunk.choices[0].delta.content):
+                continue
+            parts.append(token)
+            self.tokens += 1
+            self._emit(token)
+        if usage_tokens is not None:
+            self.tokens = usage_tokens
+        self.text = "".join(parts).strip().strip('"')
+        if (response_cache := llm_response_cache()) is not None:
+            response_cache.put(key, model, self.text)
+
+@lru_cache(maxsize=1)
+def llm_response_cache() -> LLMResponseCache | None:
+    return open_llm_cache()
+
+@lru_cache(maxsize=1)
+def shared_rate_limiter() -> TokenBucket:
+    return TokenBucket()
+
+def use_llm_client(client) -> None:
+    global cli
+    cli = client
+
+def new_async_client() -> AsyncGroq:
+    return AsyncGroq(api_key=api_key, max_retries=0)
+
+def perform_groq_request(prompt: str, **params) -> str:
+    messages = [{
+        "role": "user",
+        "content": prompt,       
+    }]
+    response_cache = llm_response_cache()
+    if response_cache is None:
+        return complete(messages, params)
+    return response_cache.get_or_compute(response_key(model, messages, params), model, lambda: complete(messages, params))
+
+def stream_groq_request(prompt: str, **params) -> TokenStream:
+    return TokenStream(prompt, **params)
+
+async def perform_groq_request_async(prompt: str, client: AsyncGroq, limiter: TokenBucket | None = None, **params) -> str:
+    messages = [{"role": "user", "content": prompt}]
+    response_cache = llm_response_cache()
+    if response_cache is None:
+        return await complete_async(client, messages, params, limiter)
+    return await response_cache.get_or_compute_async(response_key(model, messages, params), model, lambda: complete_async(client, messages, params, limiter))
+
+def complete(messages: list[dict], params: dict) -> str:
     resp = cli.chat.completions.create(
         model=model,
-        messages=[{
-            "role": "user",
-            "content": prompt,       
-        }]
+        messages=messages,
+        **params,
     )
     text = (resp.choices[0].message.content or "").strip().strip('"')
-    return text
\ No newline at end of file
+    return text
+
+async def complete_async(client: AsyncGroq, messages: list[dict], params: dict, limiter: TokenBucket | None = None) -> str:
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            resp = await client.chat.completions.create(model=model, messages=messages, **params)
+        except RateLimitError as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, e.response.headers.get("retry-after")))
+            continue
+        return (resp.choices[0].message.content or "").strip().strip('"')
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    try:
+        return float(retry_after) + random.uniform(0, LLM_BACKOFF_BASE)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
\ No newline at end of file
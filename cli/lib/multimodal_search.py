@@ -1,45 +1,98 @@
 import os
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
-from sentence_transformers import SentenceTransformer
 
-from .search_utils import load_movies
-from .semantic_search import cosine_similarity
+from .search_utils import (
+    CACHE_DIR,
+    DEFAULT_SEARCH_LIMIT,
+    IMAGE_EXTENSIONS,
+    IMAGE_DECODE_WORKERS,
+    IMAGE_BATCH_SIZE,
+)
+from .catalog import open_catalog
+from .semantic_search import SemanticSearch
+from .vector_utils import l2_normalize, top_k_indices
+
+CLIP_TEXT_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "clip_text_embeddings.npy")
+CLIP_TEXT_EMBEDDINGS_MANIFEST_PATH = os.path.join(CACHE_DIR, "clip_text_embeddings_manifest.json")
+
+class MultimodalSearch(SemanticSearch):
+    embeddings_path = CLIP_TEXT_EMBEDDINGS_PATH
+    manifest_path = CLIP_TEXT_EMBEDDINGS_MANIFEST_PATH
 
-class MultimodalSearch:
     def __init__(self, documents: list, model_name="clip-ViT-B-32"):
-        self.model = SentenceTransformer(model_name)
-        self.documents = documents
-        self.texts = [f"{d['title']}: {d['description']}" for d in self.documents]
-        self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
+        super().__init__(model_name)
+        self.text_embeddings = self.load_or_create_embeddings(documents)
+
+    def _document_text(self, doc: dict) -> str:
+        return f"{doc['title']}: {doc['description']}"
 
     def embed_image(self, image_path: str):
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
-        image = Image.open(image_path)
-        return self.model.encode([image])[0]
+        return self.embed_images([image_path])[0]
+
+    def embed_images(self, image_paths: list[str]) -> np.ndarray:
+        with ThreadPoolExecutor(max_workers=IMAGE_DECODE_WORKERS) as pool:
+            images = list(pool.map(load_image, image_paths))
+        return self.model.encode(images, batch_size=IMAGE_BATCH_SIZE)
+
+    def search_with_image(self, image_path: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+        return self.search_with_images([image_path], limit)[0]
+
+    def search_with_images(self, image_paths: list[str], limit: int = DEFAULT_SEARCH_LIMIT) -> list[list[dict]]:
+        if not image_paths:
+            return []
+        image_embeds = l2_normalize(self.embed_images(image_paths))
+        scores = self.embedding_store.scores(image_embeds)
+        return [
+            self._format_image_results(self._rescore(row, image_embed, limit), limit)
+            for row, image_embed in zip(scores, image_embeds)
+        ]
 
-    def search_with_image(self, image_path: str):
-        image_embed = self.embed_image(image_path)
-        
-        for i, embed in enumerate(self.text_embeddings):
-            self.documents[i]["similarity"] = cosine_similarity(image_embed, embed)
+    def _format_image_results(self, scores: np.ndarray, limit: int) -> list[dict]:
+        results = []
+        for i in top_k_indices(scores, limit, self.embedding_doc_idxs):
+            results.append({**self.documents[self.embedding_doc_idxs[i]], "similarity": float(scores[i])})
+        return results
 
-        results = sorted(self.documents, key=lambda x: x["similarity"], reverse=True)
-        return results[:5]   
+def load_image(image_path: str) -> Image.Image:
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+    image = Image.open(image_path)
+    image.load()
+    return image
 
-    
+def collect_image_paths(paths: list[str]) -> list[str]:
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            image_paths.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            image_paths.append(path)
+    return image_paths
 
 def verify_image_embedding_command(image_path: str):
-    movies = load_movies()
+    movies = open_catalog()
     ms = MultimodalSearch(movies)
     embedding = ms.embed_image(image_path)
     print(f"Embedding shape: {embedding.shape[0]} dimensions")
 
-def image_search_command(image_path: str):
-    movies = load_movies()
+def image_search_command(paths: list[str], limit: int = DEFAULT_SEARCH_LIMIT):
+    image_paths = collect_image_paths(paths)
+    if not image_paths:
+        print("No images found")
+        return
+    movies = open_catalog()
     ms = MultimodalSearch(movies)
-    results = ms.search_with_image(image_path)
-    for i, res in enumerate(results, 1):
-        print(f"{i}. {res["title"]} (similarity: {res["similarity"]:.3f})")
-        print(f"   {res["description"][:100]}\n")
+    batch_results = ms.search_with_images(image_paths, limit)
+    for image_path, results in zip(image_paths, batch_results):
+        if len(image_paths) > 1:
+            print(f"== {image_path}")
+        for i, res in enumerate(results, 1):
+            print(f"{i}. {res["title"]} (similarity: {res["similarity"]:.3f})")
+            print(f"   {res["description"][:100]}\n")
@@ -0,0 +1,198 @@
+import os, json, time, uuid, pickle, hashlib, threading
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from functools import partial
+
+from .search_utils import (
+    QUERY_CACHE_DIR,
+    QUERY_CACHE_ENV,
+    QUERY_CACHE_MODES,
+    DEFAULT_QUERY_CACHE_MODE,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    QUERY_CACHE_DISK_SIZE,
+    INDEX_VERSION_PATH,
+)
+
+MISSING = object()
+
+_version_lock = threading.Lock()
+_version_cache = (None, "")
+
+class QueryCache:
+    def __init__(self, name: str, max_entries: int = QUERY_CACHE_SIZE, ttl: float | None = QUERY_CACHE_TTL, disk: bool = False, versioned: bool = True) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.versioned = versioned
+        self.directory = os.path.join(QUERY_CACHE_DIR, name) if disk else None
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+    def get(self, key: Hashable):
+        version = self._current_version()
+        now = time.time()
+        with self._lock:
+            self._sync_version(version)
+            entry = self.entries.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)
+
+        value = self._disk_get(key, version, now)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, value, now)
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        version = self._current_version()
+        now = time.time()
+        with self._lock:
+            self._sync_version(version)
+            self._remember(key, value, now)
+        self._disk_put(key, value, version, now)
+
+    def get_or_compute(self, key: Hashable, compute: Callable):
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def _current_version(self) -> str:
+        return index_version() if self.versioned else ""
+
+    def _sync_version(self, version: str) -> None:
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: Hashable, value, now: float) -> None:
+        self.entries[key] = (now, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _disk_path(self, key: Hashable) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()}.pkl")
+
+    def _disk_get(self, key: Hashable, version: str, now: float):
+        if self.directory is None:
+            return MISSING
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, stored_version, created, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return MISSING
+        if stored_key != key or stored_version != version or self._expired(created, now):
+            return MISSING
+        os.utime(path)
+        return value
+
+    def _disk_put(self, key: Hashable, value, version: str, now: float) -> None:
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, version, now, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._disk_writes += 1
+        if self._disk_writes % 64 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - QUERY_CACHE_DISK_SIZE)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class CachedRanker:
+    def __init__(self, cache: QueryCache, key: tuple, make_ranker: Callable[[], Callable]) -> None:
+        self.cache = cache
+        self.key = key
+        self.make_ranker = make_ranker
+        self.ranker = None
+
+    def __call__(self, depth: int):
+        return self.cache.get_or_compute((*self.key, depth), partial(self._rank, depth))
+
+    def _rank(self, depth: int):
+        if self.ranker is None:
+            self.ranker = self.make_ranker()
+        return self.ranker(depth)
+
+def query_cache_mode(mode: str | None = None) -> str:
+    if mode is None:
+        mode = os.environ.get(QUERY_CACHE_ENV, "").strip().lower() or DEFAULT_QUERY_CACHE_MODE
+    if mode not in QUERY_CACHE_MODES:
+        raise ValueError(f"Unknown {QUERY_CACHE_ENV} mode '{mode}', expected one of {QUERY_CACHE_MODES}")
+    return mode
+
+def open_query_cache(name: str, max_entries: int = QUERY_CACHE_SIZE, versioned: bool = True, mode: str | None = None) -> QueryCache | None:
+    mode = query_cache_mode(mode)
+    if mode == "off":
+        return None
+    return QueryCache(name, max_entries, disk=mode == "disk", versioned=versioned)
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+def bump_index_version(component: str) -> None:
+    os.makedirs(os.path.dirname(INDEX_VERSION_PATH), exist_ok=True)
+    try:
+        with open(INDEX_VERSION_PATH, "r") as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        stamps = {}
+    stamps[component] = uuid.uuid4().hex
+    tmp_path = f"{INDEX_VERSION_PATH}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stamps, f, sort_keys=True)
+    os.replace(tmp_path, INDEX_VERSION_PATH)
+
+def index_version() -> str:
+    global _version_cache
+    try:
+        stat = os.stat(INDEX_VERSION_PATH)
+    except OSError:
+        return ""
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _version_lock:
+        if _version_cache[0] != signature:
+            try:
+                with open(INDEX_VERSION_PATH, "rb") as f:
+                    version = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                version = ""
+            _version_cache = (signature, version)
+        return _version_cache[1]
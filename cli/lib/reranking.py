@@ -1,7 +1,13 @@
-import time, re, json
-from sentence_transformers import CrossEncoder
+import re, json, asyncio
 
-from .llm_request import perform_groq_request
+from collections.abc import AsyncIterator, Callable
+from contextlib import nullcontext
+from groq import AsyncGroq
+
+from .llm_request import TokenBucket, new_async_client, shared_rate_limiter, perform_groq_request, perform_groq_request_async
+from .cross_encoder import CrossEncoderReranker, get_cross_encoder
+from .search_utils import RERANK_CONCURRENCY
+from .stage_timing import timed_stage
 
 def parse_score(s: str) -> float | None:
     m = re.search(r"\d+(\.\d+)?", s)
@@ -9,10 +15,8 @@ def parse_score(s: str) -> float | None:
         return None
     return max(0.0, min(10.0, float(m.group(0))))
 
-def rerank_individual(query: str, results: list[dict], limit: int = 5) -> list:
-    reranked = []
-    for res in results:
-        prompt = f"""Rate how well this movie matches the search query.
+def individual_prompt(query: str, res: dict) -> str:
+    return f"""Rate how well this movie matches the search query.
 
 Query: "{query}"
 Movie: {res.get("title", "")} - {res.get("document", "")}
@@ -25,16 +29,37 @@ Consider:
 Rate 0-10 (10 = perfect match).
 
 Give me ONLY the number, e.g. 8"""
-        raw_rank = perform_groq_request(prompt)
-        rank = parse_score(raw_rank)
-        if not rank:
-            rank = 0.0
-        res["metadata"]["individual_score"] = float(rank)
-        reranked.append(res)
-        time.sleep(5)
-    
-    reranked.sort(key=lambda x: x["metadata"]["individual_score"], reverse=True)
-    return reranked[:limit]
+
+async def rerank_individual_stream(query: str, results: list[dict], concurrency: int = RERANK_CONCURRENCY, limiter: TokenBucket | None = None, client: AsyncGroq | None = None) -> AsyncIterator[tuple[int, dict]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = limiter or shared_rate_limiter()
+
+    async with (new_async_client() if client is None else nullcontext(client)) as client:
+        async def score(i: int, res: dict) -> tuple[int, dict]:
+            async with semaphore:
+                raw_rank = await perform_groq_request_async(individual_prompt(query, res), client, limiter)
+            res["metadata"]["individual_score"] = float(parse_score(raw_rank) or 0.0)
+            return i, res
+
+        tasks = [asyncio.create_task(score(i, res)) for i, res in enumerate(results)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+async def rerank_individual_async(query: str, results: list[dict], limit: int = 5, on_result: Callable[[dict], None] | None = None, concurrency: int = RERANK_CONCURRENCY, client: AsyncGroq | None = None) -> list:
+    scored = []
+    async for i, res in rerank_individual_stream(query, results, concurrency, client=client):
+        scored.append((i, res))
+        if on_result:
+            on_result(res)
+    scored.sort(key=lambda x: (-x[1]["metadata"]["individual_score"], x[0]))
+    return [res for _, res in scored[:limit]]
+
+def rerank_individual(query: str, results: list[dict], limit: int = 5, on_result: Callable[[dict], None] | None = None) -> list:
+    return asyncio.run(rerank_individual_async(query, results, limit, on_result))
 
 def parse_json_list(s: str) -> float | None:
     m = re.search(r"(\[.*?\])", s)
@@ -67,23 +92,16 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
     results.sort(key=lambda x: x["metadata"]["batch_rank"])
     return results[:limit]
 
-def rerank_cross_encode(query: str, results: list[dict], limit: int = 5) -> list:
-    pairs = [[query, f"{r.get('title', '')} - {r.get('document', '')}"] for r in results]
-    cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
-    scores = cross_encoder.predict(pairs)
-
-    for i, res in enumerate(results):
-        res["metadata"]["cross_encoder_score"] = scores[i]
-    
-    results.sort(key=lambda x: x["metadata"]["cross_encoder_score"], reverse=True)
-    return results[:limit]
-
-def rerank_results(query: str, results: list[dict], method: str = "batch", limit: int = 5) -> list[dict]:
-    if method == "individual":
-        return rerank_individual(query, results, limit)
-    elif method == "batch":
-        return rerank_batch(query, results, limit)
-    elif method == "cross_encoder":
-        return rerank_cross_encode(query, results, limit)
-    else:
-        return results[:limit]
\ No newline at end of file
+def rerank_cross_encode(query: str, results: list[dict], limit: int = 5, cross_encoder: CrossEncoderReranker | None = None) -> list:
+    return (cross_encoder or get_cross_encoder()).rerank(query, results, limit)
+
+def rerank_results(query: str, results: list[dict], method: str = "batch", limit: int = 5, on_result: Callable[[dict], None] | None = None, cross_encoder: CrossEncoderReranker | None = None) -> list[dict]:
+    with timed_stage("rerank"):
+        if method == "individual":
+            return rerank_individual(query, results, limit, on_result)
+        elif method == "batch":
+            return rerank_batch(query, results, limit)
+        elif method == "cross_encoder":
+            return rerank_cross_encode(query, results, limit, cross_encoder)
+        else:
+            return results[:limit]
\ No newline at end of file
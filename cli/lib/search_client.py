@@ -0,0 +1,34 @@
+import os, json
+import urllib.request, urllib.error
+
+from .search_utils import (
+    SEARCH_SERVER_ENV,
+    SERVER_REQUEST_TIMEOUT,
+)
+
+def search_server_url() -> str | None:
+    url = os.environ.get(SEARCH_SERVER_ENV, "").strip()
+    return url.rstrip("/") if url else None
+
+def request_search(endpoint: str, payload: dict) -> list[dict]:
+    url = search_server_url()
+    if not url:
+        raise RuntimeError(f"Search server is not configured. Set {SEARCH_SERVER_ENV}, e.g. http://127.0.0.1:8765")
+
+    req = urllib.request.Request(
+        f"{url}/{endpoint}",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=SERVER_REQUEST_TIMEOUT) as resp:
+            return json.load(resp)["results"]
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.load(e).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise RuntimeError(f"Search server error ({e.code}): {message}") from e
+    except urllib.error.URLError as e:
+        raise RuntimeError(f"Search server at {url} is unreachable: {e.reason}") from e
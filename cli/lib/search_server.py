@@ -0,0 +1,186 @@
+import json, threading, time
+import numpy as np
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .keyword_search import InvertedIndex
+from .semantic_search import ChunkedSemanticSearch
+from .hybrid_search import HybridSearch
+from .catalog import RecordStore, open_catalog
+from .search_utils import (
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_ALPHA,
+    DEFAULT_SERVER_HOST,
+    DEFAULT_SERVER_PORT,
+    RRF_K,
+    CHUNK_INDEX_TYPES,
+    DEFAULT_CHUNK_INDEX,
+    IVF_N_PROBE,
+    EMBEDDING_DTYPES,
+    DEFAULT_EMBEDDING_DTYPE,
+    SERVER_THREADS,
+)
+
+SEARCH_ENDPOINTS = ("bm25search", "search", "search_chunked", "weighted_search", "rrf_search")
+
+class SearchEngines:
+    def __init__(self, threads: int = SERVER_THREADS) -> None:
+        self.threads = threads
+        self._slots = threading.BoundedSemaphore(threads)
+        self._lock = threading.Lock()
+        self._movies = None
+        self._idx = None
+        self._semantic = None
+        self._hybrid = None
+        self._variants = {}
+        self._variants_lock = threading.Lock()
+
+    @property
+    def movies(self) -> RecordStore:
+        with self._lock:
+            if self._movies is None:
+                self._movies = open_catalog()
+            return self._movies
+
+    @property
+    def idx(self) -> InvertedIndex:
+        return self.hybrid.idx
+
+    @property
+    def semantic(self) -> ChunkedSemanticSearch:
+        movies = self.movies
+        with self._lock:
+            if self._semantic is None:
+                semantic = ChunkedSemanticSearch()
+                semantic.load_or_create_embeddings(movies)
+                semantic.load_or_create_chunk_embeddings(movies)
+                self._semantic = semantic
+            return self._semantic
+
+    @property
+    def hybrid(self) -> HybridSearch:
+        movies, semantic = self.movies, self.semantic
+        with self._lock:
+            if self._hybrid is None:
+                # two legs per in-flight request, so concurrent requests never queue against the leg deadline
+                self._hybrid = HybridSearch(movies, semantic_search=semantic, leg_workers=2 * self.threads)
+            return self._hybrid
+
+    def semantic_for(self, payload: dict) -> ChunkedSemanticSearch:
+        index_type = payload.get("index", DEFAULT_CHUNK_INDEX)
+        n_probe = number_param(payload, "n_probe", int, IVF_N_PROBE)
+        dtype = payload.get("dtype", DEFAULT_EMBEDDING_DTYPE)
+        if index_type not in CHUNK_INDEX_TYPES:
+            raise ValueError(f"'index' must be one of {CHUNK_INDEX_TYPES}")
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"'dtype' must be one of {EMBEDDING_DTYPES}")
+        if n_probe <= 0:
+            raise ValueError("'n_probe' must be positive")
+        if (index_type, n_probe, dtype) == (DEFAULT_CHUNK_INDEX, IVF_N_PROBE, DEFAULT_EMBEDDING_DTYPE):
+            return self.semantic
+
+        movies = self.movies
+        with self._variants_lock:
+            key = (index_type, n_probe, dtype)
+            if key not in self._variants:
+                semantic = ChunkedSemanticSearch(index_type=index_type, n_probe=n_probe, embedding_dtype=dtype)
+                semantic.load_or_create_embeddings(movies)
+                semantic.load_or_create_chunk_embeddings(movies)
+                self._variants[key] = semantic
+            return self._variants[key]
+
+    def warm_up(self) -> None:
+        self.hybrid
+
+    def handle(self, endpoint: str, payload: dict) -> list[dict]:
+        if not isinstance(payload, dict):
+            raise ValueError("request body must be a JSON object")
+        query = payload.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("'query' must be a non-empty string")
+        limit = number_param(payload, "limit", int, DEFAULT_SEARCH_LIMIT)
+        if limit <= 0:
+            raise ValueError("'limit' must be positive")
+
+        with self._slots:
+            return self._search(endpoint, query, limit, payload)
+
+    def _search(self, endpoint: str, query: str, limit: int, payload: dict) -> list[dict]:
+        match endpoint:
+            case "bm25search":
+                return self.idx.bm25_search(query, limit)
+            case "search":
+                return self.semantic_for(payload).search(query, limit)
+            case "search_chunked":
+                return self.semantic_for(payload).search_chunks(query, limit)
+            case "weighted_search":
+                return self.hybrid.weighted_search(query, number_param(payload, "alpha", float, DEFAULT_ALPHA), limit)
+            case "rrf_search":
+                return self.hybrid.rrf_search(query, number_param(payload, "k", float, RRF_K), limit)
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    engines: SearchEngines = None
+
+    def do_GET(self) -> None:
+        if self.path.strip("/") == "health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"unknown endpoint: {self.path}"})
+
+    def do_POST(self) -> None:
+        endpoint = self.path.strip("/")
+        if endpoint not in SEARCH_ENDPOINTS:
+            self._send_json(404, {"error": f"unknown endpoint: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            start = time.perf_counter()
+            results = self.engines.handle(endpoint, payload)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"results": results, "elapsed_ms": round(elapsed_ms, 3)})
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body, default=to_json_value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def number_param(payload: dict, name: str, convert: type, default):
+    try:
+        return convert(payload.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number") from None
+
+def to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def serve_command(host: str = DEFAULT_SERVER_HOST, port: int = DEFAULT_SERVER_PORT, preload: bool = True) -> None:
+    engines = SearchEngines(SERVER_THREADS)
+    if preload:
+        print("Loading index, embeddings and models...")
+        start = time.perf_counter()
+        engines.warm_up()
+        print(f"Search engines ready in {time.perf_counter() - start:.2f}s")
+
+    handler = type("BoundSearchRequestHandler", (SearchRequestHandler,), {"engines": engines})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving search API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
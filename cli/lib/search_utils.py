@@ -1,4 +1,5 @@
 import os, json
+import numpy as np
 from typing import Any
 
 DEFAULT_SEARCH_LIMIT = 5
@@ -16,12 +17,87 @@ BM25_B = 0.75
 
 SEARCH_MULTIPLIER = 5
 
+HYBRID_LEG_TIMEOUT = 10.0
+HYBRID_LEG_WORKERS = 4
+HYBRID_CANDIDATE_MULTIPLIER = 500
+ADAPTIVE_DEPTH_MULTIPLIER = 40
+ADAPTIVE_DEPTH_GROWTH = 2
+
+STEM_CACHE_SIZE = 1 << 16
+TOKENIZE_CHUNK_SIZE = 256
+DEFAULT_INDEX_WORKERS = 0
+MIN_SHARD_SIZE = 500
+
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_QUEUE_DEPTH = 4
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+DEFAULT_EMBEDDING_DTYPE = "float32"
+RESCORE_MULTIPLIER = 4
+SCORE_BLOCK_SIZE = 16384
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+IMAGE_DECODE_WORKERS = 8
+IMAGE_BATCH_SIZE = 32
+QUERY_BATCH_SIZE = 256
+
+CHUNK_INDEX_TYPES = ("exact", "ivf")
+DEFAULT_CHUNK_INDEX = "exact"
+IVF_N_PROBE = 8
+IVF_KMEANS_ITERATIONS = 10
+IVF_TRAINING_SAMPLES_PER_LIST = 64
+
+SEARCH_SERVER_ENV = "HOOPLA_SEARCH_SERVER"
+DEFAULT_SERVER_HOST = "127.0.0.1"
+DEFAULT_SERVER_PORT = 8765
+SERVER_REQUEST_TIMEOUT = 60
+SERVER_THREADS = 8
+
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 DATA_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
 GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
 STOPWORDS_PATH = os.path.join(PROJECT_ROOT, "data", "stopwords.txt")
 CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
 
+CATALOG_READ_CHUNK_SIZE = 1 << 20
+
+QUERY_CACHE_ENV = "HOOPLA_QUERY_CACHE"
+QUERY_CACHE_MODES = ("off", "memory", "disk")
+DEFAULT_QUERY_CACHE_MODE = "memory"
+QUERY_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+QUERY_CACHE_TTL = 3600
+QUERY_CACHE_DISK_SIZE = 16384
+QUERY_CACHE_DIR = os.path.join(CACHE_DIR, "query_cache")
+INDEX_VERSION_PATH = os.path.join(CACHE_DIR, "index_version.json")
+
+LLM_CACHE_ENV = "HOOPLA_LLM_CACHE"
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite3")
+LLM_CACHE_TTL = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 50000
+
+LLM_REQUESTS_PER_MINUTE = 30
+LLM_RATE_BURST = 5
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 30.0
+RERANK_CONCURRENCY = 8
+RAG_BATCH_WORKERS = 4
+RAG_CONTEXT_TOKENS = 768
+RAG_TOKENIZER_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EVALUATION_WORKERS = 4
+EVALUATION_CHECKPOINT_PATH = os.path.join(CACHE_DIR, "evaluation_checkpoint.jsonl")
+LATENCY_PERCENTILES = (50, 95, 99)
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L2-v2"
+CROSS_ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_CROSS_ENCODER_BACKEND = "torch"
+CROSS_ENCODER_ONNX_INT8_FILE = "onnx/model_qint8_avx2.onnx"
+CROSS_ENCODER_BATCH_SIZE = 16
+CROSS_ENCODER_MAX_LENGTH = 256
+CROSS_ENCODER_THREADS = 0
+CROSS_ENCODER_CACHE_SIZE = 65536
+
 def load_movies() -> list[dict]:
     with open(DATA_PATH, "r") as f:
         data = json.load(f)
@@ -36,6 +112,13 @@ def load_stopwords() -> list[str]:
     with open(STOPWORDS_PATH, "r") as f:
         return f.read().splitlines()
     
+def save_array(path: str, array: np.ndarray) -> None:
+    # write-then-rename, so processes that still map the old file keep a valid view
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
 def format_search_result(doc_id: str, title: str, document: str, score: float, **metadata: Any) -> dict[str, Any]:
     return {
         "id": doc_id,
@@ -1,12 +1,13 @@
-import os, json
+import os, json, time
 import numpy as np
+from collections.abc import Callable, Iterator
+from functools import lru_cache, partial
 import regex as re
 
 from sentence_transformers import SentenceTransformer
 
 from .search_utils import (
     CACHE_DIR,
-    load_movies,
     format_search_result,
     format_semantic_search_result,
     DEFAULT_SEARCH_LIMIT,
@@ -14,38 +15,135 @@ from .search_utils import (
     DEFAULT_CHUNK_OVERLAP,
     MAX_CHUNK_SIZE,
     DOCUMENT_PREVIEW_LENGTH,
+    DEFAULT_CHUNK_INDEX,
+    IVF_N_PROBE,
+    EMBEDDING_BATCH_SIZE,
+    QUERY_BATCH_SIZE,
+    DEFAULT_EMBEDDING_DTYPE,
+    RESCORE_MULTIPLIER,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    load_test_cases,
+)
+from .search_client import search_server_url, request_search
+from .vector_utils import PrefixRanker, l2_normalize, top_k_indices, max_per_segment
+from .ann_index import ExactIndex, IVFFlatIndex
+from .embedding_store import EmbeddingStore
+from .build_pipeline import BuildStats, encode_stream
+from .query_cache import MISSING, open_query_cache, normalize_query, bump_index_version
+from .stage_timing import timed_stage
+from .catalog import (
+    CatalogDiff,
+    catalog_hashes,
+    catalog_fingerprint,
+    diff_catalog,
+    document_ids,
+    document_map,
+    open_catalog,
+    hashes_to_manifest,
+    hashes_from_manifest,
 )
 
 MOVIE_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "movie_embeddings.npy")
 CHUNK_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "chunk_embeddings.npy")
 CHUNK_METADATA_PATH = os.path.join(CACHE_DIR, "chunk_metadata.json")
+CHUNK_IVF_INDEX_PATH = os.path.join(CACHE_DIR, "chunk_ivf_index.npz")
+MOVIE_EMBEDDINGS_MANIFEST_PATH = os.path.join(CACHE_DIR, "movie_embeddings_manifest.json")
+
+@lru_cache(maxsize=None)
+def load_embedding_model(model_name: str) -> SentenceTransformer:
+    return SentenceTransformer(model_name)
 
 class SemanticSearch:
-    def __init__(self, model_name="all-MiniLM-L6-v2") -> None:
-        self.model = SentenceTransformer(model_name)
+    embeddings_path = MOVIE_EMBEDDINGS_PATH
+    manifest_path = MOVIE_EMBEDDINGS_MANIFEST_PATH
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", embedding_dtype: str = DEFAULT_EMBEDDING_DTYPE, rescore: bool = True, cache_mode: str | None = None) -> None:
+        self.model_name = model_name
+        self.model = load_embedding_model(model_name)
+        self.embedding_dtype = embedding_dtype
+        self.rescore = rescore
         self.embeddings = None
+        self.embedding_store = None
         self.documents = None
         self.document_map = {}
-    
-    def build_embeddings(self, documents: list[dict]) -> list:
+        self.document_positions = {}
+        self.document_id_array = None
+        self.embedding_ids = []
+        self.embedding_hashes = {}
+        self.embedding_doc_idxs = None
+        self.last_embeddings_sync = None
+        self.last_embeddings_build = None
+        self.query_embedding_cache = open_query_cache("query_embeddings", QUERY_EMBEDDING_CACHE_SIZE, versioned=False, mode=cache_mode)
+
+    def _set_documents(self, documents: list[dict]) -> None:
         self.documents = documents
-        self.document_map = {}
-        doc_strings = []
-        for doc in self.documents:
-            self.document_map[doc["id"]] = doc
-            doc_strings.append(f"{doc["title"]} {doc["description"]}")
-        self.embeddings = self.model.encode(doc_strings, show_progress_bar=True)
+        self.document_map = document_map(documents)
+        self.document_id_array = np.array(document_ids(documents), dtype=np.int64)
+        self.document_positions = {doc_id: i for i, doc_id in enumerate(self.document_id_array.tolist())}
+
+    def _document_text(self, doc: dict) -> str:
+        return f"{doc["title"]} {doc["description"]}"
 
+    def _encode_documents(self, documents: list[dict], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        records = ((self._document_text(doc), None) for doc in documents)
+        return encode_stream(self.model, records, batch_size)[0]
+
+    def _save_embeddings(self) -> None:
         os.makedirs(CACHE_DIR, exist_ok=True)
-        np.save(MOVIE_EMBEDDINGS_PATH, self.embeddings)
+        self.embedding_store = EmbeddingStore(self.embeddings, self.embedding_dtype)
+        self.embedding_store.save(self.embeddings_path)
+        with open(self.manifest_path, "w") as f:
+            json.dump({
+                "model": self.model_name,
+                "dimension": self.model.get_sentence_embedding_dimension(),
+                "catalog_hash": catalog_fingerprint(self.embedding_hashes),
+                "ids": self.embedding_ids,
+                "documents": hashes_to_manifest(self.embedding_hashes),
+            }, f)
+        bump_index_version(os.path.basename(self.embeddings_path))
+        self.embedding_doc_idxs = np.array([self.document_positions[doc_id] for doc_id in self.embedding_ids], dtype=np.int64)
+    
+    def build_embeddings(self, documents: list[dict], batch_size: int = EMBEDDING_BATCH_SIZE) -> list:
+        start = time.perf_counter()
+        self._set_documents(documents)
+        self.embeddings = self._encode_documents(documents, batch_size)
+        self.embedding_ids = document_ids(documents)
+        self.embedding_hashes = catalog_hashes(documents)
+        self._save_embeddings()
+        self.last_embeddings_sync = CatalogDiff(added=list(self.embedding_ids))
+        self.last_embeddings_build = BuildStats(len(documents), len(self.embeddings), time.perf_counter() - start)
         return self.embeddings
+
+    def update_embeddings(self, documents: list[dict]) -> CatalogDiff:
+        self._set_documents(documents)
+        diff = diff_catalog(documents, self.embedding_hashes)
+        if not diff.is_empty:
+            stale = diff.stale
+            kept = [i for i, doc_id in enumerate(self.embedding_ids) if doc_id not in stale]
+            fresh = [self.document_map[doc_id] for doc_id in diff.fresh]
+            self.embeddings = np.concatenate([self.embeddings[kept], self._encode_documents(fresh)])
+            self.embedding_ids = [self.embedding_ids[i] for i in kept] + [doc["id"] for doc in fresh]
+            self.embedding_hashes = catalog_hashes(documents)
+            self._save_embeddings()
+        self.embedding_doc_idxs = np.array([self.document_positions[doc_id] for doc_id in self.embedding_ids], dtype=np.int64)
+        self.last_embeddings_sync = diff
+        return diff
         
     def load_or_create_embeddings(self, documents: list[dict]) -> list:
-        if os.path.exists(MOVIE_EMBEDDINGS_PATH):
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_PATH)
-            if len(self.embeddings) == len(documents):
-                self.documents = documents
-                self.document_map = {doc["id"]: doc for doc in documents}
+        if os.path.exists(self.embeddings_path) and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            store = EmbeddingStore.open(self.embeddings_path, self.embedding_dtype)
+            if (
+                manifest.get("model") == self.model_name and
+                manifest.get("dimension") == self.model.get_sentence_embedding_dimension() and
+                len(store) == len(manifest["ids"])
+            ):
+                self.embeddings = store.vectors
+                self.embedding_store = store
+                self.embedding_ids = manifest["ids"]
+                self.embedding_hashes = hashes_from_manifest(manifest["documents"])
+                self.update_embeddings(documents)
                 return self.embeddings
         
         return self.build_embeddings(documents)
@@ -53,10 +151,27 @@ class SemanticSearch:
     def generate_embedding(self, text: str):
         if not text or not text.strip():
             raise ValueError("Cannot generate embedding for empty text")
-        embedding = self.model.encode([text])
-        return embedding[0]
-    
-    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: list[str]) -> np.ndarray:
+        if any(not text or not text.strip() for text in texts):
+            raise ValueError("Cannot generate embedding for empty text")
+        texts = [normalize_query(text) for text in texts]
+        if self.query_embedding_cache is None:
+            with timed_stage("embed"):
+                return self.model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE)
+
+        embeddings = [self.query_embedding_cache.get((self.model_name, text)) for text in texts]
+        misses = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is MISSING))
+        if misses:
+            with timed_stage("embed"):
+                encoded = {text: np.array(embedding) for text, embedding in zip(misses, self.model.encode(misses, batch_size=EMBEDDING_BATCH_SIZE))}
+            for text, embedding in encoded.items():
+                self.query_embedding_cache.put((self.model_name, text), embedding)
+            embeddings = [encoded[text] if embedding is MISSING else embedding for text, embedding in zip(texts, embeddings)]
+        return np.stack(embeddings)
+
+    def _check_embeddings_loaded(self) -> None:
         if (
             self.embeddings is None or 
             self.embeddings.size == 0 or 
@@ -64,17 +179,38 @@ class SemanticSearch:
             len(self.documents) == 0
         ):
             raise ValueError("No embeddings loaded. Call `load_or_create_embeddings` first.")
-        query_embedding = self.generate_embedding(query)
+    
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+        self._check_embeddings_loaded()
+        query_embedding = l2_normalize(self.generate_embedding(query))
+        scores = self.embedding_store.scores(query_embedding)
+        return self._format_results(self._rescore(scores, query_embedding, limit), limit)
+
+    def search_many(self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT) -> list[list[dict]]:
+        self._check_embeddings_loaded()
+        query_embeddings = l2_normalize(self.generate_embeddings(queries))
+
+        results = []
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = query_embeddings[start:start + QUERY_BATCH_SIZE]
+            scores = self.embedding_store.scores(batch)
+            results.extend(self._format_results(self._rescore(row, query_embedding, limit), limit) for row, query_embedding in zip(scores, batch))
+        return results
 
-        scores = []
-        for i, doc_embed in enumerate(self.embeddings):
-            scores.append((cosine_similarity(query_embedding, doc_embed), self.documents[i]))
-        scores.sort(key=lambda x: x[0], reverse=True)
+    def _rescore(self, scores: np.ndarray, query_embedding: np.ndarray, limit: int) -> np.ndarray:
+        if not (self.embedding_store.quantized and self.rescore):
+            return scores
+        candidates = top_k_indices(scores, limit * RESCORE_MULTIPLIER, self.embedding_doc_idxs)
+        rescored = np.full(len(scores), -np.inf, dtype=np.float32)
+        rescored[candidates] = self.embedding_store.exact_scores(query_embedding, candidates)
+        return rescored
 
+    def _format_results(self, scores: np.ndarray, limit: int) -> list[dict]:
         results = []
-        for score, doc in scores[:limit]:
+        for i in top_k_indices(scores, limit, self.embedding_doc_idxs):
+            doc = self.documents[self.embedding_doc_idxs[i]]
             f_result = format_semantic_search_result(
-                score=score,
+                score=float(scores[i]),
                 title=doc["title"],
                 description=doc["description"][:DOCUMENT_PREVIEW_LENGTH],
             )
@@ -95,8 +231,10 @@ def embed_text(text: str) -> None:
 
 def verify_embeddings() -> None:
     search = SemanticSearch()
-    movies = load_movies()
+    movies = open_catalog()
     embeds = search.load_or_create_embeddings(movies)
+    if search.last_embeddings_build:
+        print(f"Built embeddings: {search.last_embeddings_build}")
     print(f"Number of docs:   {len(movies)}")
     print(f"Embeddings shape: {embeds.shape[0]} vectors in {embeds.shape[1]} dimensions")
 
@@ -117,11 +255,14 @@ def cosine_similarity(vec1, vec2):
     
     return dot_product / (norm1 * norm2)
 
-def semantic_search(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-    search_instance = SemanticSearch()
-    movies = load_movies()
-    search_instance.load_or_create_embeddings(movies)
-    results = search_instance.search(query, limit)
+def semantic_search(query: str, limit: int = DEFAULT_SEARCH_LIMIT, dtype: str = DEFAULT_EMBEDDING_DTYPE) -> list[dict]:
+    if search_server_url():
+        results = request_search("search", {"query": query, "limit": limit, "dtype": dtype})
+    else:
+        search_instance = SemanticSearch(embedding_dtype=dtype)
+        movies = open_catalog()
+        search_instance.load_or_create_embeddings(movies)
+        results = search_instance.search(query, limit)
 
     print(f"Query: {query}")
     print(f"Top {len(results)} results:")
@@ -178,20 +319,44 @@ def semantic_chunk_text(text: str, max_chunk_size: int = MAX_CHUNK_SIZE, overlap
         print(f"{i}. {res}")
 
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name="all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", index_type: str = DEFAULT_CHUNK_INDEX, n_probe: int = IVF_N_PROBE, embedding_dtype: str = DEFAULT_EMBEDDING_DTYPE, rescore: bool = True, cache_mode: str | None = None) -> None:
+        super().__init__(model_name, embedding_dtype, rescore, cache_mode)
         self.chunk_embeddings = None
+        self.chunk_store = None
         self.chunk_metadata = None
-
-    def build_chunk_embeddings(self, documents):
-        self.documents = documents
-        self.document_map = {}
-        doc_chunks = []
-        chunks_metadata = []
-
-        for i, doc in enumerate(self.documents):
-            self.document_map[doc["id"]] = doc
-
+        self.chunk_movie_idxs = None
+        self.index_type = index_type
+        self.n_probe = n_probe
+        self.exact_index = None
+        self.ivf_index = None
+        self.chunk_hashes = {}
+        self.last_chunk_sync = None
+        self.last_chunk_build = None
+
+    def _build_chunk_indexes(self) -> None:
+        self.exact_index = ExactIndex(self.chunk_store)
+        self.ivf_index = IVFFlatIndex(self.chunk_embeddings, n_probe=self.n_probe)
+        self.ivf_index.build()
+        self.ivf_index.save(CHUNK_IVF_INDEX_PATH)
+
+    def _load_chunk_indexes(self) -> None:
+        self.exact_index = ExactIndex(self.chunk_store)
+        try:
+            self.ivf_index = IVFFlatIndex.load(CHUNK_IVF_INDEX_PATH, self.chunk_embeddings, self.n_probe)
+        except (OSError, ValueError, KeyError):
+            self._build_chunk_indexes()
+
+    def _refresh_chunk_indexes(self) -> None:
+        if self.ivf_index is None or self.ivf_index.centroids is None:
+            self._build_chunk_indexes()
+            return
+        self.exact_index = ExactIndex(self.chunk_store)
+        self.ivf_index.vectors = self.chunk_embeddings
+        self.ivf_index.add()
+        self.ivf_index.save(CHUNK_IVF_INDEX_PATH)
+
+    def _iter_chunks(self, documents: list[dict]) -> Iterator[tuple[str, dict]]:
+        for doc in documents:
             text = doc.get("description", "")
             if not text.strip():
                 continue
@@ -199,36 +364,90 @@ class ChunkedSemanticSearch(SemanticSearch):
             chunks_to_add = chunk_sentences(text, max_chunk_size=MAX_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP)
         
             for j, chunk in enumerate(chunks_to_add):
-                doc_chunks.append(chunk)
-                chunks_metadata.append({
-                    "movie_idx": i,
+                yield chunk, {
+                    "movie_id": doc["id"],
+                    "movie_idx": self.document_positions[doc["id"]],
                     "chunk_idx": j,
                     "total_chunks": len(chunks_to_add),
-                })
-        self.chunk_embeddings = self.model.encode(doc_chunks)
-        self.chunk_metadata = chunks_metadata
+                }
+
+    def _chunk_documents(self, documents: list[dict], batch_size: int = EMBEDDING_BATCH_SIZE) -> tuple[np.ndarray, list[dict]]:
+        return encode_stream(self.model, self._iter_chunks(documents), batch_size)
 
+    def _save_chunk_embeddings(self) -> None:
         os.makedirs(CACHE_DIR, exist_ok=True)
-        np.save(CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings)
+        self.chunk_store = EmbeddingStore(self.chunk_embeddings, self.embedding_dtype)
+        self.chunk_store.save(CHUNK_EMBEDDINGS_PATH)
         with open(CHUNK_METADATA_PATH, "w") as f:
-            json.dump({"chunks": chunks_metadata, "total_chunks": len(doc_chunks)}, f, indent=2)
+            json.dump({
+                "model": self.model_name,
+                "dimension": self.model.get_sentence_embedding_dimension(),
+                "chunks": self.chunk_metadata,
+                "total_chunks": len(self.chunk_metadata),
+                "documents": hashes_to_manifest(self.chunk_hashes),
+            }, f, indent=2)
+        bump_index_version(os.path.basename(CHUNK_EMBEDDINGS_PATH))
+
+    def _align_chunks(self) -> None:
+        for m in self.chunk_metadata:
+            m["movie_idx"] = self.document_positions[m["movie_id"]]
+        self.chunk_movie_idxs = np.array([m["movie_idx"] for m in self.chunk_metadata], dtype=np.int64)
+
+    def build_chunk_embeddings(self, documents, batch_size: int = EMBEDDING_BATCH_SIZE):
+        start = time.perf_counter()
+        self._set_documents(documents)
+        self.chunk_embeddings, self.chunk_metadata = self._chunk_documents(documents, batch_size)
+        self.chunk_hashes = catalog_hashes(documents)
+        self._align_chunks()
+        self._save_chunk_embeddings()
+        self._build_chunk_indexes()
+        self.last_chunk_sync = CatalogDiff(added=list(self.chunk_hashes))
+        self.last_chunk_build = BuildStats(len(documents), len(self.chunk_embeddings), time.perf_counter() - start)
 
         return self.chunk_embeddings
 
-    def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+    def update_chunk_embeddings(self, documents: list[dict]) -> CatalogDiff:
+        self._set_documents(documents)
+        diff = diff_catalog(documents, self.chunk_hashes)
+        if self.exact_index is None:
+            self._load_chunk_indexes()
+        self.last_chunk_sync = diff
+        if diff.is_empty:
+            self._align_chunks()
+            return diff
+
+        stale = diff.stale
+        kept = [i for i, m in enumerate(self.chunk_metadata) if m["movie_id"] not in stale]
+        fresh_embeddings, fresh_metadata = self._chunk_documents([self.document_map[doc_id] for doc_id in diff.fresh])
+        self.chunk_embeddings = np.concatenate([self.chunk_embeddings[kept], fresh_embeddings])
+        self.chunk_metadata = [self.chunk_metadata[i] for i in kept] + fresh_metadata
+        self.chunk_hashes = catalog_hashes(documents)
+        self._align_chunks()
+        self._save_chunk_embeddings()
+        self._refresh_chunk_indexes()
+        return diff
+
+    def load_or_create_chunk_embeddings(self, documents: list[dict], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
         if os.path.exists(CHUNK_EMBEDDINGS_PATH) and os.path.exists(CHUNK_METADATA_PATH):
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_PATH)
+            store = EmbeddingStore.open(CHUNK_EMBEDDINGS_PATH, self.embedding_dtype)
             with open(CHUNK_METADATA_PATH, "r") as f:
                 loaded = json.load(f)
+            if (
+                loaded.get("model") == self.model_name and
+                loaded.get("dimension") == self.model.get_sentence_embedding_dimension() and
+                len(store) == loaded["total_chunks"] and
+                "documents" in loaded
+            ):
+                self.chunk_embeddings = store.vectors
+                self.chunk_store = store
                 self.chunk_metadata = loaded["chunks"]
-            if len(self.chunk_embeddings) == loaded["total_chunks"]:
-                self.documents = documents
-                self.document_map = {doc["id"]: doc for doc in documents}
+                self.chunk_hashes = hashes_from_manifest(loaded["documents"])
+                self.update_chunk_embeddings(documents)
                 return self.chunk_embeddings
         
-        return self.build_chunk_embeddings(documents)
+        return self.build_chunk_embeddings(documents, batch_size)
     
-    def search_chunks(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+    def _check_chunk_embeddings_loaded(self) -> None:
         if (
             self.chunk_embeddings is None or 
             self.chunk_embeddings.size == 0 or 
@@ -236,44 +455,180 @@ class ChunkedSemanticSearch(SemanticSearch):
             len(self.chunk_metadata) == 0
         ):
             raise ValueError("No embeddings loaded. Call `load_or_create_chunk_embeddings` first.")
-        
-        query_embed = self.generate_embedding(query)
-
-        idxs_to_scores = {}
-        for i, chunk_embed in enumerate(self.chunk_embeddings):
-            co_sim = cosine_similarity(query_embed, chunk_embed)
-            m_idx = self.chunk_metadata[i]["movie_idx"]
-            if m_idx not in idxs_to_scores or idxs_to_scores[m_idx] < co_sim:
-                idxs_to_scores[m_idx] = co_sim
-        
-        ranked = list(idxs_to_scores.items())
-        ranked.sort(key=lambda x: x[1], reverse=True)
-        
+
+    def search_chunks(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT):
+        self._check_chunk_embeddings_loaded()
+        query_embed = l2_normalize(self.generate_embedding(query))
+        return self._format_chunk_results(*self._movie_ranker(query_embed)(limit))
+
+    def search_chunks_many(self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT) -> list[list[dict]]:
+        return [self._format_chunk_results(*ranker(limit)) for ranker in self._movie_rankers(queries)]
+
+    def search_chunks_top_k(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> tuple[np.ndarray, np.ndarray]:
+        return self.chunk_ranker(query)(limit)
+
+    def chunk_ranker(self, query: str) -> Callable[[int], tuple[np.ndarray, np.ndarray]]:
+        self._check_chunk_embeddings_loaded()
+        return partial(self._ranked_ids, self._movie_ranker(l2_normalize(self.generate_embedding(query))))
+
+    def chunk_rankers(self, queries: list[str]) -> list[Callable[[int], tuple[np.ndarray, np.ndarray]]]:
+        return [partial(self._ranked_ids, ranker) for ranker in self._movie_rankers(queries)]
+
+    def document_chunk_scores(self, query: str, doc_ids: list[int]) -> dict[tuple[int, int], float]:
+        self._check_chunk_embeddings_loaded()
+        query_embed = l2_normalize(self.generate_embeddings([query]))[0]
+        movie_idxs = [self.document_positions[doc_id] for doc_id in doc_ids if doc_id in self.document_positions]
+        chunk_ids = np.flatnonzero(np.isin(self.chunk_movie_idxs, movie_idxs))
+        scores = self.chunk_store.exact_scores(query_embed, chunk_ids)
+        return {
+            (self.chunk_metadata[c]["movie_id"], self.chunk_metadata[c]["chunk_idx"]): float(score)
+            for c, score in zip(chunk_ids.tolist(), scores.tolist())
+        }
+
+    def _ranked_ids(self, movie_ranker: Callable[[int], tuple[np.ndarray, np.ndarray]], limit: int) -> tuple[np.ndarray, np.ndarray]:
+        with timed_stage("scan"):
+            movie_idxs, scores = movie_ranker(limit)
+        return self.document_id_array[movie_idxs], scores
+
+    def _movie_rankers(self, queries: list[str]) -> list[Callable[[int], tuple[np.ndarray, np.ndarray]]]:
+        self._check_chunk_embeddings_loaded()
+        query_embeds = l2_normalize(self.generate_embeddings(queries))
+        if self.index_type == "ivf":
+            return [self._movie_ranker(query_embed) for query_embed in query_embeds]
+
+        rankers = []
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = query_embeds[start:start + QUERY_BATCH_SIZE]
+            with timed_stage("scan"):
+                movie_idxs, movie_scores = max_per_segment(self.chunk_store.scores(batch), self.chunk_movie_idxs)
+            rankers.extend(
+                self._prefix_ranker(partial(self._rescored_top_movies, movie_idxs, row, query_embed), len(movie_idxs))
+                for row, query_embed in zip(movie_scores, batch)
+            )
+        return rankers
+
+    def _movie_ranker(self, query_embed: np.ndarray) -> Callable[[int], tuple[np.ndarray, np.ndarray]]:
+        with timed_stage("scan"):
+            if self.index_type == "ivf":
+                chunk_ids, chunk_scores = self.ivf_index.candidates(query_embed, self.n_probe)
+                movie_idxs, movie_scores = max_per_segment(chunk_scores, self.chunk_movie_idxs[chunk_ids])
+                return PrefixRanker(partial(self._top_movies, movie_idxs, movie_scores), len(movie_idxs))
+            chunk_ids, chunk_scores = self.exact_index.candidates(query_embed)
+            movie_idxs, movie_scores = max_per_segment(chunk_scores, self.chunk_movie_idxs[chunk_ids])
+        return self._prefix_ranker(partial(self._rescored_top_movies, movie_idxs, movie_scores, query_embed), len(movie_idxs))
+
+    def _prefix_ranker(self, ranker: Callable[[int], tuple[np.ndarray, np.ndarray]], size: int) -> Callable[[int], tuple[np.ndarray, np.ndarray]]:
+        # rescoring only covers a depth-sized candidate pool, so each depth must rescore its own
+        if self.chunk_store.quantized and self.rescore:
+            return ranker
+        return PrefixRanker(ranker, size)
+
+    def _rescored_top_movies(self, movie_idxs: np.ndarray, movie_scores: np.ndarray, query_embed: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        return self._top_movies(movie_idxs, self._rescore_movies(movie_idxs, movie_scores, query_embed, limit), limit)
+
+    def _top_movies(self, movie_idxs: np.ndarray, movie_scores: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        top = top_k_indices(movie_scores, limit, movie_idxs)
+        return movie_idxs[top], movie_scores[top]
+
+    def _rescore_movies(self, movie_idxs: np.ndarray, movie_scores: np.ndarray, query_embed: np.ndarray, limit: int) -> np.ndarray:
+        if not (self.chunk_store.quantized and self.rescore):
+            return movie_scores
+        candidates = np.sort(top_k_indices(movie_scores, limit * RESCORE_MULTIPLIER, movie_idxs))
+        chunk_ids = np.flatnonzero(np.isin(self.chunk_movie_idxs, movie_idxs[candidates]))
+        _, exact = max_per_segment(self.chunk_store.exact_scores(query_embed, chunk_ids), self.chunk_movie_idxs[chunk_ids])
+        rescored = np.full(len(movie_scores), -np.inf, dtype=np.float32)
+        rescored[candidates] = exact
+        return rescored
+
+    def _format_chunk_results(self, movie_idxs: np.ndarray, movie_scores: np.ndarray) -> list[dict]:
         results = []
-        for idx, score in ranked[:limit]:
-            doc = self.documents[idx]
+        for movie_idx, score in zip(movie_idxs, movie_scores):
+            doc = self.documents[movie_idx]
             results.append(format_search_result(
                 doc_id=doc["id"],
                 title=doc["title"],
                 document=doc["description"],
-                score=score,
+                score=float(score),
             ))
         
         return results
 
-def embed_chunks():
-    movies = load_movies()
+def embed_chunks(batch_size: int = EMBEDDING_BATCH_SIZE):
+    movies = open_catalog()
     chunked_search = ChunkedSemanticSearch()
-    embeddings = chunked_search.load_or_create_chunk_embeddings(movies)
+    embeddings = chunked_search.load_or_create_chunk_embeddings(movies, batch_size)
+    if chunked_search.last_chunk_build:
+        print(f"Built chunk embeddings: {chunked_search.last_chunk_build}")
     print(f"Generated {len(embeddings)} chunked embeddings")
 
-def search_chunked(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> None:
-    movies = load_movies()
-    search_instant = ChunkedSemanticSearch()
-    search_instant.load_or_create_chunk_embeddings(movies)
-    results = search_instant.search_chunks(query, limit)
+def search_chunked(query: str, limit: int = DEFAULT_SEARCH_LIMIT, index_type: str = DEFAULT_CHUNK_INDEX, n_probe: int = IVF_N_PROBE, dtype: str = DEFAULT_EMBEDDING_DTYPE) -> None:
+    if search_server_url():
+        results = request_search("search_chunked", {"query": query, "limit": limit, "index": index_type, "n_probe": n_probe, "dtype": dtype})
+    else:
+        movies = open_catalog()
+        search_instant = ChunkedSemanticSearch(index_type=index_type, n_probe=n_probe, embedding_dtype=dtype)
+        search_instant.load_or_create_chunk_embeddings(movies)
+        results = search_instant.search_chunks(query, limit)
     print(f"Query: {query}")
     print("Results:")
     for i, res in enumerate(results, 1):
         print(f"\n{i}. {res["title"]} (score: {res["score"]:.4f})")
-        print(f"   {res["document"][:DOCUMENT_PREVIEW_LENGTH]}...")
\ No newline at end of file
+        print(f"   {res["document"][:DOCUMENT_PREVIEW_LENGTH]}...")
+
+def ann_recall_command(limit: int = DEFAULT_SEARCH_LIMIT, n_probe: int = IVF_N_PROBE) -> None:
+    movies = open_catalog()
+    search_instant = ChunkedSemanticSearch(n_probe=n_probe)
+    search_instant.load_or_create_chunk_embeddings(movies)
+    test_cases = load_test_cases()
+
+    recalls, exact_time, ivf_time = [], 0.0, 0.0
+    for c in test_cases:
+        search_instant.index_type = "exact"
+        start = time.perf_counter()
+        exact = search_instant.search_chunks(c["query"], limit)
+        exact_time += time.perf_counter() - start
+
+        search_instant.index_type = "ivf"
+        start = time.perf_counter()
+        approx = search_instant.search_chunks(c["query"], limit)
+        ivf_time += time.perf_counter() - start
+
+        exact_ids = {r["id"] for r in exact}
+        recall = len(exact_ids & {r["id"] for r in approx}) / len(exact_ids) if exact_ids else 1.0
+        recalls.append(recall)
+        print(f"- {c['query']}: recall@{limit} {recall:.3f}")
+
+    n_lists = search_instant.ivf_index.n_lists
+    print(f"\nIVF ({n_lists} lists, n_probe={n_probe}) vs exact over {len(test_cases)} golden queries")
+    print(f"Mean recall@{limit}: {sum(recalls) / max(1, len(recalls)):.3f}")
+    print(f"Exact: {exact_time * 1000 / max(1, len(test_cases)):.2f} ms/query, IVF: {ivf_time * 1000 / max(1, len(test_cases)):.2f} ms/query")
+
+def quantization_recall_command(dtype: str, limit: int = DEFAULT_SEARCH_LIMIT, rescore: bool = True) -> None:
+    movies = open_catalog()
+    exact_search = ChunkedSemanticSearch()
+    exact_search.load_or_create_chunk_embeddings(movies)
+    quantized_search = ChunkedSemanticSearch(embedding_dtype=dtype, rescore=rescore)
+    quantized_search.load_or_create_chunk_embeddings(movies)
+    test_cases = load_test_cases()
+
+    recalls, exact_time, quantized_time = [], 0.0, 0.0
+    for c in test_cases:
+        start = time.perf_counter()
+        exact = exact_search.search_chunks(c["query"], limit)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = quantized_search.search_chunks(c["query"], limit)
+        quantized_time += time.perf_counter() - start
+
+        exact_ids = {r["id"] for r in exact}
+        recall = len(exact_ids & {r["id"] for r in approx}) / len(exact_ids) if exact_ids else 1.0
+        recalls.append(recall)
+        print(f"- {c['query']}: recall@{limit} {recall:.3f}")
+
+    exact_bytes = exact_search.chunk_store.vectors.nbytes
+    quantized_bytes = quantized_search.chunk_store.codes.nbytes
+    print(f"\n{dtype} ({'with' if rescore else 'without'} exact rescoring) vs float32 over {len(test_cases)} golden queries")
+    print(f"Mean recall@{limit}: {sum(recalls) / max(1, len(recalls)):.3f}")
+    print(f"Scanned matrix: {quantized_bytes / 2**20:.2f} MiB vs {exact_bytes / 2**20:.2f} MiB")
+    print(f"float32: {exact_time * 1000 / max(1, len(test_cases)):.2f} ms/query, {dtype}: {quantized_time * 1000 / max(1, len(test_cases)):.2f} ms/query")
@@ -0,0 +1,49 @@
+import time, threading
+
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+
+STAGES = ("tokenize", "bm25", "embed", "scan", "fusion", "rerank")
+
+_active: ContextVar["StageTimings | None"] = ContextVar("stage_timings", default=None)
+
+class StageTimings:
+    def __init__(self) -> None:
+        self.seconds = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] += seconds
+
+    def as_dict(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self.seconds)
+
+@contextmanager
+def record_stages() -> Iterator[StageTimings]:
+    timings = StageTimings()
+    token = _active.set(timings)
+    try:
+        yield timings
+    finally:
+        _active.reset(token)
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    timings = _active.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+def in_current_context(fn: Callable) -> Callable:
+    # executor threads start with an empty context, so carry the active recorder over
+    return partial(copy_context().run, fn)
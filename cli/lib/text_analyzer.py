@@ -0,0 +1,61 @@
+import math, string, os
+
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+from nltk.stem import PorterStemmer
+
+from .search_utils import (
+    STEM_CACHE_SIZE,
+    TOKENIZE_CHUNK_SIZE,
+    load_stopwords,
+)
+
+_worker_analyzer = None
+
+class TextAnalyzer:
+    def __init__(self, stopwords: Iterable[str] | None = None, stem_cache_size: int = STEM_CACHE_SIZE) -> None:
+        self.stopwords = frozenset(load_stopwords() if stopwords is None else stopwords)
+        self.stem_cache_size = stem_cache_size
+        self.translation = str.maketrans('', '', string.punctuation)
+        self.stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def analyze(self, text: str) -> list[str]:
+        stopwords, stem = self.stopwords, self.stem
+        return [stem(token) for token in text.lower().translate(self.translation).split() if token not in stopwords]
+
+    def analyze_many(self, texts: list[str], workers: int = 1) -> list[list[str]]:
+        return [tokens for shard in self.map_shards(analyze_shard, texts, workers) for tokens in shard]
+
+    def map_shards(self, fn: Callable[["TextAnalyzer", Sequence], object], items: Sequence, workers: int = 1, min_shard_size: int = TOKENIZE_CHUNK_SIZE) -> list:
+        n_shards = min(resolve_workers(workers), math.ceil(len(items) / min_shard_size))
+        if n_shards <= 1:
+            return [fn(self, items)]
+        with ProcessPoolExecutor(max_workers=n_shards, initializer=init_worker_analyzer, initargs=self.config()) as pool:
+            return list(pool.map(partial(run_in_worker, fn), split_into_shards(items, n_shards)))
+
+    def config(self) -> tuple[frozenset[str], int]:
+        return self.stopwords, self.stem_cache_size
+
+@lru_cache(maxsize=1)
+def default_analyzer() -> TextAnalyzer:
+    return TextAnalyzer()
+
+def init_worker_analyzer(stopwords: frozenset[str], stem_cache_size: int) -> None:
+    global _worker_analyzer
+    _worker_analyzer = TextAnalyzer(stopwords, stem_cache_size)
+
+def run_in_worker(fn: Callable[[TextAnalyzer, Sequence], object], items: Sequence) -> object:
+    return fn(_worker_analyzer, items)
+
+def analyze_shard(analyzer: TextAnalyzer, texts: Sequence[str]) -> list[list[str]]:
+    return [analyzer.analyze(text) for text in texts]
+
+def split_into_shards(items: Sequence, n_shards: int) -> list[Sequence]:
+    size = math.ceil(len(items) / max(1, n_shards)) or 1
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def resolve_workers(workers: int) -> int:
+    return workers if workers > 0 else os.cpu_count() or 1
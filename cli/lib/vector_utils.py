@@ -0,0 +1,43 @@
+import numpy as np
+
+from collections.abc import Callable
+
+class PrefixRanker:
+    # the first depth uses the cheap top-k unless eager; a deeper one ranks every candidate once and later depths slice it
+    def __init__(self, top_k: Callable[[int], tuple[np.ndarray, np.ndarray]], size: int, eager: bool = False) -> None:
+        self.top_k = top_k
+        self.size = size
+        self.ranked = None
+        self.called = eager
+
+    def __call__(self, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.ranked is None:
+            if not self.called:
+                self.called = True
+                return self.top_k(limit)
+            self.ranked = self.top_k(self.size)
+        ids, scores = self.ranked
+        return ids[:limit], scores[:limit]
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_indices(scores: np.ndarray, limit: int, tie_breakers: np.ndarray | None = None) -> np.ndarray:
+    if limit <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if limit < len(scores):
+        kth_score = scores[np.argpartition(-scores, limit - 1)[limit - 1]]
+        candidates = np.flatnonzero(scores >= kth_score)
+    else:
+        candidates = np.arange(len(scores))
+    ties = candidates if tie_breakers is None else tie_breakers[candidates]
+    return candidates[np.lexsort((ties, -scores[candidates]))][:limit]
+
+def max_per_segment(scores: np.ndarray, segment_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if len(segment_ids) == 0:
+        return np.array([], dtype=np.int64), scores[..., :0]
+    starts = np.flatnonzero(np.r_[True, segment_ids[1:] != segment_ids[:-1]])
+    return segment_ids[starts], np.maximum.reduceat(scores, starts, axis=-1)
@@ -1,5 +1,6 @@
 import argparse
 from lib.multimodal_search import verify_image_embedding_command, image_search_command
+from lib.search_utils import DEFAULT_SEARCH_LIMIT
     
 
 def main():
@@ -10,7 +11,8 @@ def main():
     verify_image_embed_parser.add_argument("image", type=str, help="Image path for embedding")
 
     image_search_parser = subparsers.add_parser("image_search", help="Search docs in database using image")
-    image_search_parser.add_argument("image", type=str, help="Image path for search")
+    image_search_parser.add_argument("images", type=str, nargs="+", help="Image paths or directories of images, searched in one batch")
+    image_search_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Limit of returned movies per image")
 
     args = parser.parse_args()
 
@@ -18,7 +20,7 @@ def main():
         case "verify_image_embedding":
             verify_image_embedding_command(args.image)
         case "image_search":
-            image_search_command(args.image)
+            image_search_command(args.images, args.limit)
         case _:
             parser.print_help()
 
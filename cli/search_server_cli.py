@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from lib.search_server import serve_command
+
+from lib.search_utils import (
+    DEFAULT_SERVER_HOST,
+    DEFAULT_SERVER_PORT,
+    SEARCH_SERVER_ENV,
+)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search Server CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    serve_parser = subparsers.add_parser("serve", help=f"Keep index, embeddings and models warm and serve search over HTTP (point CLIs to it with {SEARCH_SERVER_ENV})")
+    serve_parser.add_argument("--host", type=str, default=DEFAULT_SERVER_HOST, help=f"Interface to bind (default={DEFAULT_SERVER_HOST})")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT, help=f"Port to listen on (default={DEFAULT_SERVER_PORT})")
+    serve_parser.add_argument("--lazy", action="store_true", help="Load engines on first request instead of at startup")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            serve_command(args.host, args.port, not args.lazy)
+        case _:
+            parser.print_help()
+
+if __name__ == "__main__":
+    main()
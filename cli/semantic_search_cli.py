@@ -12,6 +12,8 @@ from lib.semantic_search import (
     semantic_chunk_text,
     embed_chunks,
     search_chunked,
+    ann_recall_command,
+    quantization_recall_command,
 )
 
 from lib.search_utils import (
@@ -19,6 +21,12 @@ from lib.search_utils import (
     DEFAULT_CHUNK_SIZE,
     DEFAULT_CHUNK_OVERLAP,
     MAX_CHUNK_SIZE,
+    CHUNK_INDEX_TYPES,
+    DEFAULT_CHUNK_INDEX,
+    IVF_N_PROBE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DTYPES,
+    DEFAULT_EMBEDDING_DTYPE,
 )
 
 def main() -> None:
@@ -38,6 +46,7 @@ def main() -> None:
     search_parser = subparsers.add_parser("search", help="Search movies using semantic vectors")
     search_parser.add_argument("query", type=str, help="Query to search")
     search_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Limit of returned sources")
+    search_parser.add_argument("--dtype", type=str, choices=EMBEDDING_DTYPES, default=DEFAULT_EMBEDDING_DTYPE, help="Precision of the scanned embedding matrix, top candidates are rescored in float32")
 
     chunk_parser = subparsers.add_parser("chunk", help="Breaks given text into chunks")
     chunk_parser.add_argument("text", type=str, help="Text to divide")
@@ -49,11 +58,24 @@ def main() -> None:
     semantic_chunk_parser.add_argument("--max-chunk-size", type=int, nargs='?', default=MAX_CHUNK_SIZE, help="Maximum size of single chunk")
     semantic_chunk_parser.add_argument("--overlap", type=int, nargs='?', default=DEFAULT_CHUNK_OVERLAP, help="Number of overlapping sentences")
 
-    subparsers.add_parser("embed_chunks", help="Loads existing or generate new chunk embeddings for dataset")
+    embed_chunks_parser = subparsers.add_parser("embed_chunks", help="Loads existing or generate new chunk embeddings for dataset")
+    embed_chunks_parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help=f"Chunks encoded per model batch while chunking runs ahead (default={EMBEDDING_BATCH_SIZE})")
 
     search_chunks_parser = subparsers.add_parser("search_chunked", help="Search movies using semantic vectors in the chunked dataset")
     search_chunks_parser.add_argument("query", type=str, help="Query to search")
     search_chunks_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="Limit of returned sources")
+    search_chunks_parser.add_argument("--index", type=str, choices=CHUNK_INDEX_TYPES, default=DEFAULT_CHUNK_INDEX, help="Exact scan or approximate IVF index over chunk embeddings")
+    search_chunks_parser.add_argument("--n-probe", type=int, default=IVF_N_PROBE, help=f"Number of IVF lists to probe, higher is slower but more accurate (default={IVF_N_PROBE})")
+    search_chunks_parser.add_argument("--dtype", type=str, choices=EMBEDDING_DTYPES, default=DEFAULT_EMBEDDING_DTYPE, help="Precision of the scanned embedding matrix, top candidates are rescored in float32")
+
+    ann_recall_parser = subparsers.add_parser("ann_recall", help="Measure IVF recall and latency against exact chunk search on the golden dataset")
+    ann_recall_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="k for recall@k")
+    ann_recall_parser.add_argument("--n-probe", type=int, default=IVF_N_PROBE, help=f"Number of IVF lists to probe (default={IVF_N_PROBE})")
+
+    quantization_recall_parser = subparsers.add_parser("quantization_recall", help="Measure recall and latency of quantized chunk embeddings against float32 on the golden dataset")
+    quantization_recall_parser.add_argument("--dtype", type=str, choices=EMBEDDING_DTYPES[1:], default="int8", help="Quantized precision to evaluate (default=int8)")
+    quantization_recall_parser.add_argument("--limit", type=int, nargs='?', default=DEFAULT_SEARCH_LIMIT, help="k for recall@k")
+    quantization_recall_parser.add_argument("--no-rescore", action="store_true", help="Rank by quantized scores only")
 
     args = parser.parse_args()
 
@@ -67,15 +89,19 @@ def main() -> None:
         case "embedquery":
             embed_query_text(args.query)
         case "search":
-            semantic_search(args.query, args.limit)
+            semantic_search(args.query, args.limit, args.dtype)
         case "chunk":
             chunk_text(args.text, args.chunk_size, args.overlap)
         case "semantic_chunk":
             semantic_chunk_text(args.text, args.max_chunk_size, args.overlap)
         case "embed_chunks":
-            embed_chunks()
+            embed_chunks(args.batch_size)
         case "search_chunked":
-            search_chunked(args.query, args.limit)
+            search_chunked(args.query, args.limit, args.index, args.n_probe, args.dtype)
+        case "ann_recall":
+            ann_recall_command(args.limit, args.n_probe)
+        case "quantization_recall":
+            quantization_recall_command(args.dtype, args.limit, not args.no_rescore)
         case _:
             parser.print_help()
 
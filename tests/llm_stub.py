@@ -0,0 +1,54 @@
+import re, asyncio, httpx
+
+from collections.abc import Callable, Iterator
+from types import SimpleNamespace
+from groq import RateLimitError
+
+class StubLLMClient:
+    def __init__(self, respond: Callable[[str], str] | dict[str, str] | None = None, default: str = "") -> None:
+        self.respond = respond
+        self.default = default
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def reply(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if callable(self.respond):
+            return self.respond(prompt)
+        if self.respond is not None:
+            return self.respond.get(prompt, self.default)
+        return self.default
+
+    def create(self, model: str, messages: list[dict], stream: bool = False, **params) -> SimpleNamespace | Iterator[SimpleNamespace]:
+        content = self.reply(messages[-1]["content"])
+        if stream:
+            return (SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None) for token in re.findall(r"\S+\s*|\s+", content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+class AsyncStubLLMClient(StubLLMClient):
+    def __init__(self, respond: Callable[[str], str] | dict[str, str] | None = None, default: str = "", delay: float | Callable[[str], float] = 0.0, rate_limited: int = 0) -> None:
+        super().__init__(respond, default)
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.active = 0
+        self.max_active = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_async))
+
+    async def create_async(self, model: str, messages: list[dict], **params) -> SimpleNamespace:
+        prompt = messages[-1]["content"]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay(prompt) if callable(self.delay) else self.delay)
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                raise rate_limit_error()
+            content = self.reply(prompt)
+        finally:
+            self.active -= 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+def rate_limit_error(retry_after: str = "0") -> RateLimitError:
+    request = httpx.Request("POST", "https://api.groq.test/openai/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
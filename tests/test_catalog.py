@@ -0,0 +1,17 @@
+import json, os, tempfile, unittest
+
+from lib.catalog import iter_json_records
+
+class IterJsonRecordsTest(unittest.TestCase):
+    def test_streams_records_across_chunk_boundaries(self):
+        movies = [{"id": i, "title": f"Movie {i}", "description": "a [bracketed], quoted \"plot\" " * (i % 4)} for i in range(50)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "movies.json")
+            with open(path, "w") as f:
+                json.dump({"source": "test", "movies": movies}, f, indent=2)
+
+            for chunk_size in (7, 64, 1 << 20):
+                self.assertEqual(list(iter_json_records(path, "movies", chunk_size)), movies)
+
+if __name__ == "__main__":
+    unittest.main()
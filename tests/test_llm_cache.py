@@ -0,0 +1,25 @@
+import asyncio, unittest
+
+from unittest import mock
+
+from lib.llm_cache import LLMResponseCache
+
+class GetOrComputeTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LLMResponseCache(":memory:")
+        self.cache.put("key", "model", "stored")
+        # the first lookup misses, as it would just before another leader's put
+        self.cache.get = mock.Mock(side_effect=[None, self.cache.get("key")])
+
+    def test_leader_rechecks_cache_before_computing(self):
+        compute = mock.Mock(return_value="fresh")
+        self.assertEqual(self.cache.get_or_compute("key", "model", compute), "stored")
+        compute.assert_not_called()
+
+    def test_async_leader_rechecks_cache_before_computing(self):
+        compute = mock.AsyncMock(return_value="fresh")
+        self.assertEqual(asyncio.run(self.cache.get_or_compute_async("key", "model", compute)), "stored")
+        compute.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import time, asyncio, unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from unittest import mock
+
+from lib import llm_request
+from lib.llm_cache import LLMResponseCache
+from tests.llm_stub import StubLLMClient, AsyncStubLLMClient
+
+class PerformGroqRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LLMResponseCache(":memory:")
+        patcher = mock.patch.object(llm_request, "llm_response_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_identical_async_requests_share_one_call(self):
+        client = AsyncStubLLMClient(default="7", delay=0.05)
+
+        async def run():
+            return await asyncio.gather(*(llm_request.perform_groq_request_async("rate it", client) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["7"] * 5)
+        self.assertEqual(client.prompts, ["rate it"])
+
+    def test_sync_request_reuses_async_response(self):
+        client = AsyncStubLLMClient(default="7")
+        asyncio.run(llm_request.perform_groq_request_async("rate it", client))
+
+        stub = StubLLMClient(default="3")
+        with mock.patch.object(llm_request, "cli", stub):
+            self.assertEqual(llm_request.perform_groq_request("rate it"), "7")
+        self.assertEqual(stub.prompts, [])
+
+class TokenBucketTest(unittest.TestCase):
+    def test_shared_limiter_is_reused(self):
+        self.assertIs(llm_request.shared_rate_limiter(), llm_request.shared_rate_limiter())
+
+    def test_bucket_paces_callers_across_event_loops(self):
+        bucket = llm_request.TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: asyncio.run(bucket.acquire()), range(6)))
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 50 * 0.9)
+
+if __name__ == "__main__":
+    unittest.main()
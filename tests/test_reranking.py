@@ -0,0 +1,66 @@
+import asyncio, unittest
+
+from unittest import mock
+
+from lib import llm_request
+from lib.llm_request import TokenBucket
+from lib.reranking import rerank_individual_stream, rerank_individual_async
+from tests.llm_stub import AsyncStubLLMClient
+
+class CountingBucket(TokenBucket):
+    def __init__(self) -> None:
+        super().__init__(rate=1000, capacity=1000)
+        self.acquired = 0
+
+    async def acquire(self) -> None:
+        self.acquired += 1
+        await super().acquire()
+
+def movies(n: int) -> list[dict]:
+    return [{"id": i, "title": f"Movie {i}", "document": f"plot {i}", "metadata": {}} for i in range(n)]
+
+def rating(prompt: str) -> str:
+    return {"Movie 0": "3", "Movie 1": "9", "Movie 2": "9", "Movie 3": "1"}.get(prompt.split("Movie: ")[1].split(" - ")[0], "5")
+
+class RerankIndividualTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("llm_response_cache", None), ("backoff_delay", 0.0)):
+            patcher = mock.patch.object(llm_request, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stream(self, results: list[dict], client: AsyncStubLLMClient, **kwargs) -> list[tuple[int, dict]]:
+        async def collect():
+            return [item async for item in rerank_individual_stream("space", results, client=client, **kwargs)]
+        return asyncio.run(collect())
+
+    def test_caps_in_flight_requests(self):
+        client = AsyncStubLLMClient(default="5", delay=0.01)
+        streamed = self.stream(movies(12), client, concurrency=3, limiter=CountingBucket())
+        self.assertEqual(len(streamed), 12)
+        self.assertEqual(client.max_active, 3)
+
+    def test_streams_in_completion_order(self):
+        client = AsyncStubLLMClient(respond=rating, delay=lambda prompt: 0.05 if "Movie 0" in prompt else 0.0)
+        streamed = self.stream(movies(4), client, limiter=CountingBucket())
+        self.assertEqual([i for i, _ in streamed][-1], 0)
+        self.assertEqual(sorted(i for i, _ in streamed), [0, 1, 2, 3])
+
+    def test_ranks_by_score_then_original_position(self):
+        client = AsyncStubLLMClient(respond=rating, delay=lambda prompt: 0.02 if "Movie 2" in prompt else 0.0)
+        with mock.patch("lib.reranking.shared_rate_limiter", return_value=CountingBucket()):
+            ranked = asyncio.run(rerank_individual_async("space", movies(4), limit=3, client=client))
+        self.assertEqual([r["id"] for r in ranked], [1, 2, 0])
+        self.assertEqual(ranked[0]["metadata"]["individual_score"], 9.0)
+
+    def test_retries_rate_limits_through_the_shared_bucket(self):
+        bucket = CountingBucket()
+        client = AsyncStubLLMClient(default="7", rate_limited=2)
+        with mock.patch("lib.reranking.shared_rate_limiter", return_value=bucket):
+            streamed = self.stream(movies(3), client)
+        self.assertEqual([r["metadata"]["individual_score"] for _, r in streamed], [7.0] * 3)
+        self.assertEqual(len(client.prompts), 3)
+        self.assertEqual(bucket.acquired, 5)
+
+if __name__ == "__main__":
+    unittest.main()
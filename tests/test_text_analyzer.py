@@ -0,0 +1,18 @@
+import unittest
+
+from lib.search_utils import TOKENIZE_CHUNK_SIZE
+from lib.text_analyzer import TextAnalyzer
+
+class TextAnalyzerTest(unittest.TestCase):
+    def test_pooled_matches_serial_for_custom_analyzer(self):
+        analyzer = TextAnalyzer(stopwords=["space", "the"], stem_cache_size=16)
+        texts = [f"The space pirates were running {i} missions across the galaxies" for i in range(TOKENIZE_CHUNK_SIZE * 2 + 1)]
+
+        serial = analyzer.analyze_many(texts, workers=1)
+        pooled = analyzer.analyze_many(texts, workers=2)
+
+        self.assertEqual(pooled, serial)
+        self.assertNotIn("space", serial[0])
+
+if __name__ == "__main__":
+    unittest.main()